@@ -0,0 +1,88 @@
+"""Compare the per-coin CoinGecko requests with the batched /coins/markets request.
+
+Reports the number of requests, bytes transferred and JSON parse time for both paths, offline against the
+responses in fixtures/ by default. Use --live to query the real CoinGecko API instead, the results then depend
+on the network and on what CoinGecko returns:
+
+    python benchmarks/bench_crypto_batch.py [--live] [--coins bitcoin,ethereum,polkadot]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from fakes import FakeSession
+
+API_HOST = "https://api.coingecko.com/api/v3"
+
+
+async def fetch(session, url: str) -> bytes:
+    async with session.get(url) as response:
+        response.raise_for_status()
+        return await response.read()
+
+
+def parse_time(payloads, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for payload in payloads:
+            json.loads(payload)
+    return (time.perf_counter() - start) / rounds
+
+
+async def fetch_live(coins: List[str]) -> Dict[str, List[bytes]]:
+    import aiohttp
+
+    async with aiohttp.ClientSession() as session:
+        per_coin = [await fetch(session, f"{API_HOST}/coins/{coin}") for coin in coins]
+        batched = [await fetch(session, markets_url(coins))]
+    return {"per-coin": per_coin, "batched": batched}
+
+
+async def fetch_offline(coins: List[str]) -> Dict[str, List[bytes]]:
+    session = FakeSession()
+    per_coin = [await fetch(session, f"{API_HOST}/coins/{coin}") for coin in coins]
+    batched = [await fetch(session, markets_url(coins))]
+    return {"per-coin": per_coin, "batched": batched}
+
+
+def markets_url(coins: List[str]) -> str:
+    return f"{API_HOST}/coins/markets?vs_currency=usd&ids={','.join(coins)}&per_page={len(coins)}"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--coins",
+        default="bitcoin,ethereum",
+        help="CoinGecko ids split by commas, the fixtures have bitcoin and ethereum",
+    )
+    parser.add_argument("--rounds", type=int, default=20, help="parse repetitions to average")
+    parser.add_argument("--live", action="store_true", help="query the real CoinGecko API instead of the fixtures")
+    args = parser.parse_args()
+    coins = args.coins.split(",")
+
+    fetched = await (fetch_live(coins) if args.live else fetch_offline(coins))
+
+    results = {}
+    for name, payloads in fetched.items():
+        results[name] = {
+            "requests": len(payloads),
+            "bytes": sum(len(payload) for payload in payloads),
+            "parse_ms": parse_time(payloads, args.rounds) * 1000,
+        }
+        print(
+            f"{name:>8}: {results[name]['requests']} requests, {results[name]['bytes']} bytes, "
+            f"{results[name]['parse_ms']:.2f} ms to parse"
+        )
+
+    print(
+        f"batched path transfers {results['per-coin']['bytes'] / results['batched']['bytes']:.0f}x fewer bytes "
+        f"and parses {results['per-coin']['parse_ms'] / results['batched']['parse_ms']:.0f}x faster"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""Measure the startup import time and memory of the configured tiles.
+
+Every configuration is loaded in a fresh interpreter, like the app does at startup, so the modules
+imported by one run do not speed up the next one:
+
+    python benchmarks/bench_import_time.py --rounds 5 yt crypto finance yt,crypto,finance
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_PATH = Path(__file__).parent.parent / "src"
+
+HEAVY_MODULES = ("numpy", "pandas", "yfinance", "PIL")
+
+PROBE = """
+import json, resource, sys, time
+sys.path.insert(0, {src!r})
+start = time.perf_counter()
+from pixeltracker.tiles.registry import tile_registry
+for name in {tiles!r}.split(","):
+    tile_registry.load(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def probe(tiles: str) -> dict:
+    code = PROBE.format(src=str(SRC_PATH), tiles=tiles, heavy=HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("configurations", nargs="*", default=["yt", "crypto", "finance", "yt,crypto,finance"])
+    parser.add_argument("--rounds", type=int, default=5, help="fresh interpreters started per configuration")
+    parser.add_argument("--output", help="file to write the JSON results to")
+    args = parser.parse_args()
+
+    results = {}
+    for tiles in args.configurations:
+        runs = [probe(tiles) for _ in range(args.rounds)]
+        results[tiles] = {
+            "median_seconds": statistics.median(run["seconds"] for run in runs),
+            "max_rss_kb": max(run["max_rss_kb"] for run in runs),
+            "modules": runs[-1]["modules"],
+            "heavy": runs[-1]["heavy"],
+        }
+        result = results[tiles]
+        print(
+            f"TILES={tiles:<20} {result['median_seconds'] * 1000:8.1f} ms {result['max_rss_kb'] / 1024:7.1f} MB "
+            f"{result['modules']:5d} modules, heavy: {', '.join(result['heavy']) or '-'}"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Measure the event loop lag while the Yahoo Finance tickers are refreshed.
+
+The finance fetch runs on a thread pool, so the loop lag should stay close to zero while it runs.
+Use --inline to call yfinance on the event loop, as the finance tile used to do, for comparison:
+
+    python benchmarks/bench_loop_lag.py --tickers GC=F,EURUSD=X [--inline]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from pixeltracker.monitor import LoopLagMonitor  # noqa: E402
+from pixeltracker.providers.finance import FinanceProvider  # noqa: E402
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tickers", default="GC=F,EURUSD=X", help="Yahoo Finance tickers split by commas")
+    parser.add_argument("--interval", type=float, default=0.05, help="loop probe interval in seconds")
+    parser.add_argument("--inline", action="store_true", help="fetch on the event loop instead of the thread pool")
+    args = parser.parse_args()
+
+    provider = FinanceProvider()
+    for ticker in args.tickers.split(","):
+        provider.add_ticker(ticker)
+
+    monitor = LoopLagMonitor(interval=args.interval)
+    monitor_task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(args.interval * 2)
+
+    start = time.perf_counter()
+    if args.inline:
+        provider.fetch_quotes(provider.tickers)
+    else:
+        await provider.get_data()
+    elapsed = time.perf_counter() - start
+
+    await asyncio.sleep(args.interval * 2)
+    monitor_task.cancel()
+    provider.close()
+
+    stats = monitor.stats()
+    mode = "inline" if args.inline else "thread pool"
+    print(f"{mode}: fetched {len(provider.tickers)} tickers in {elapsed:.2f} s")
+    print(
+        f"loop lag: max {stats['max_lag_ms']:.1f} ms, average {stats['average_lag_ms']:.1f} ms "
+        f"over {stats['samples']} probes"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,180 @@
+"""Time the full tile pipeline offline: fetch, render, encode and upload.
+
+Runs every tile against a fake iDotMatrix device and the recorded upstream responses in fixtures/,
+so no device nor API keys are needed. Results are written as JSON to compare releases:
+
+    python benchmarks/bench_pipeline.py --rounds 20 --output bench_results.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from fakes import (  # noqa: E402
+    FakeClient,
+    FakeConnectionManager,
+    FakeSession,
+    FakeYahooFinance,
+    install_fake_idotmatrix,
+)
+
+install_fake_idotmatrix()
+
+from pixeltracker import screen as screen_module  # noqa: E402
+from pixeltracker.http_client import http_client  # noqa: E402
+from pixeltracker.providers import finance  # noqa: E402
+from pixeltracker.screen import IDotMatrixScreen  # noqa: E402
+from pixeltracker.settings import settings  # noqa: E402
+from pixeltracker.tiles import Crypto, YoutubeViewers  # noqa: E402
+from pixeltracker.tiles.finance import Finance  # noqa: E402
+
+# Rendered on its own to time the render and encode stages apart from run()
+SAMPLE_TEXT = "$12.3K"
+
+
+def summarize(samples: List[float]) -> dict:
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "min_ms": ordered[0] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def bench(rounds: int) -> Dict[str, dict]:
+    screen = IDotMatrixScreen(FakeConnectionManager())
+    await screen.connect("auto")
+    # Uploads are deferred until the supervisor reports the link as up
+    supervisor_task = asyncio.create_task(screen.supervisor.run())
+    await asyncio.wait_for(screen.supervisor.connected.wait(), timeout=5)
+
+    tiles = [
+        YoutubeViewers(screen, False),
+        Crypto(screen, "bitcoin", False),
+        Crypto(screen, "ethereum", False),
+        Finance(screen, "GC=F", False),
+        Finance(screen, "EURUSD=X", False),
+    ]
+
+    timings: Dict[str, Dict[str, List[float]]] = {}
+    for _ in range(rounds):
+        for tile in tiles:
+            stages = timings.setdefault(tile.key, {})
+
+            start = time.perf_counter()
+            for source in tile.data_sources():
+                await source.refresh()
+            await tile.get_data()
+            fetched = time.perf_counter()
+
+            await tile.run()
+            shown = time.perf_counter()
+
+            frame = tile.render(SAMPLE_TEXT)
+            rendered = time.perf_counter()
+            png_data = screen.encode_frame(frame)
+            encoded = time.perf_counter()
+            # Force the upload, the fake device is always showing the same frame otherwise
+            screen.forget_frame()
+            await screen.set_frame(frame)
+            uploaded = time.perf_counter()
+
+            stages.setdefault("fetch", []).append(fetched - start)
+            stages.setdefault("render", []).append(rendered - shown)
+            stages.setdefault("encode", []).append(encoded - rendered)
+            stages.setdefault("upload", []).append(uploaded - encoded)
+            stages.setdefault("run", []).append(shown - fetched)
+            stages.setdefault("total", []).append(fetched - start + shown - fetched)
+            stages.setdefault("png_bytes", []).append(len(png_data))
+
+    supervisor_task.cancel()
+    # A silently deferred upload would make the upload stage measure nothing
+    assert screen.conn.writes, "no write reached the fake device"
+    assert screen.conn.bytes_sent > 0, "no byte reached the fake device"
+    assert screen.frame_stats.uploaded > 0, "no frame was uploaded"
+
+    results = {}
+    for key, stages in timings.items():
+        png_sizes = stages.pop("png_bytes")
+        results[key] = {stage: summarize(samples) for stage, samples in stages.items()}
+        results[key]["png_bytes"] = statistics.median(png_sizes)
+    results["device"] = {
+        "writes": len(screen.conn.writes),
+        "bytes_sent": screen.conn.bytes_sent,
+        "frames": vars(screen.frame_stats),
+    }
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=10, help="times every tile is run")
+    parser.add_argument("--ble-throughput", type=int, default=2000, help="simulated BLE throughput in bytes/s")
+    parser.add_argument("--output", default="bench_results.json", help="file to write the JSON results to")
+    args = parser.parse_args()
+
+    FakeConnectionManager.throughput = args.ble_throughput
+    screen_module.BleakClient = FakeClient
+
+    # Offline and without API quotas
+    fake_yf = FakeYahooFinance()
+    finance.yf = fake_yf
+    settings.CRYPTO_REQUESTS_PER_MINUTE = 1000000
+    settings.CRYPTO_REQUESTS_PER_DAY = 1000000
+    settings.YOUTUBE_REQUESTS_PER_MINUTE = 1000000
+    settings.YOUTUBE_REQUESTS_PER_DAY = 1000000
+    http_client.session = FakeSession()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        finance.finance_provider.metadata.path = Path(cache_dir) / "finance-metadata.json"
+        results = await bench(args.rounds)
+    finance.finance_provider.close()
+
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "rounds": args.rounds,
+        "ble_throughput": args.ble_throughput,
+        "http_requests": http_client.session.requests,
+        "http_bytes": http_client.session.bytes_received,
+        "yfinance_downloads": fake_yf.downloads,
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+
+    for key, stages in results.items():
+        if key == "device":
+            continue
+        print(
+            f"{key:>16}: total {stages['total']['median_ms']:7.1f} ms "
+            f"(fetch {stages['fetch']['median_ms']:.1f}, render {stages['render']['median_ms']:.1f}, "
+            f"encode {stages['encode']['median_ms']:.1f}, upload {stages['upload']['median_ms']:.1f})"
+        )
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""Send a burst of LNbits webhooks, with retries and duplicate deliveries, to the HTTP app in process.
+
+Every payment is delivered --deliveries times concurrently, as LNbits does when it retries, so the results
+show the dedupe hit rate, the messages actually queued and the request latency. Use --ipc to hand the messages
+over the Unix socket of the ingress process mode instead of queueing them directly:
+
+    python benchmarks/bench_webhook_burst.py --payments 200 --deliveries 3 [--ipc]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from fakes import install_fake_idotmatrix  # noqa: E402
+
+install_fake_idotmatrix()
+
+from pixeltracker import app, ingress  # noqa: E402
+from pixeltracker.dedupe import SeenIndex  # noqa: E402
+from pixeltracker.messages import MessageQueue  # noqa: E402
+
+
+async def post(path: str, body: dict, headers: List[Tuple[bytes, bytes]] = ()) -> Tuple[int, float]:
+    """calls the ASGI app like uvicorn would, returns the status and the latency in seconds"""
+    data = json.dumps(body).encode()
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(data)).encode()), *headers],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", app.PORT),
+    }
+    received = False
+    result = {}
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()
+        received = True
+        return {"type": "http.request", "body": data, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+
+    start = time.perf_counter()
+    await app.server_app(scope, receive, send)
+    return result["status"], time.perf_counter() - start
+
+
+def payload(payment_hash: str) -> dict:
+    return {
+        "payment_hash": payment_hash,
+        "payment_request": "lnbc1fake",
+        "amount": 21000,
+        "comment": "GM",
+        "lnurlp": "fake",
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--payments", type=int, default=200, help="distinct payments in the burst")
+    parser.add_argument("--deliveries", type=int, default=3, help="times every payment webhook is delivered")
+    parser.add_argument("--ipc", action="store_true", help="send the messages through the ingress Unix socket")
+    parser.add_argument("--output", help="file to write the JSON results to")
+    args = parser.parse_args()
+
+    # A queue large enough to hold the whole burst and a fresh, in memory index
+    queue = MessageQueue(maxsize=args.payments * args.deliveries, coalesce_window=0)
+    seen = SeenIndex(persist=False)
+    sink = ingress.QueueSink(queue, seen)
+    listener = socket_sink = None
+    if args.ipc:
+        listener = ingress.IngressListener(sink, Path(tempfile.mkdtemp()) / "ingress.sock")
+        await listener.start()
+        socket_sink = ingress.SocketSink(listener.path)
+        ingress.set_sink(socket_sink)
+    else:
+        ingress.set_sink(sink)
+
+    hashes = [uuid.uuid4().hex for _ in range(args.payments)]
+    requests = [
+        post("/lnbits", payload(payment_hash), [(b"product", b"donation")])
+        for _ in range(args.deliveries)
+        for payment_hash in hashes
+    ]
+    start = time.perf_counter()
+    responses = await asyncio.gather(*requests)
+    elapsed = time.perf_counter() - start
+
+    if listener is not None:
+        await socket_sink.close()
+        await listener.close()
+
+    latencies = sorted(latency for _, latency in responses)
+    stats = seen.stats()
+    results = {
+        "requests": len(responses),
+        "errors": sum(1 for code, _ in responses if code >= 400),
+        "queued": queue.qsize(),
+        "dedupe_hits": stats["hits"],
+        "dedupe_hit_rate": stats["hits"] / len(responses),
+        "requests_per_second": len(responses) / elapsed,
+        "latency_ms": {
+            "median": statistics.median(latencies) * 1000,
+            "p95": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            "max": latencies[-1] * 1000,
+        },
+    }
+    print(
+        f"{results['requests']} requests, {results['errors']} errors, {results['queued']} messages queued, "
+        f"dedupe hit rate {results['dedupe_hit_rate']:.1%}"
+    )
+    print(
+        f"latency: median {results['latency_ms']['median']:.2f} ms, p95 {results['latency_ms']['p95']:.2f} ms, "
+        f"max {results['latency_ms']['max']:.2f} ms, {results['requests_per_second']:.0f} requests/s"
+    )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+"""Offline stand-ins for the iDotMatrix device and the upstream APIs.
+
+`install_fake_idotmatrix` must be called before importing pixeltracker, so the screen talks to a fake
+device that records the payloads and simulates the Bluetooth throughput instead of a real panel.
+"""
+
+import asyncio
+import json
+import sys
+import types
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+FIXTURES_PATH = Path(__file__).parent / "fixtures"
+
+FAKE_ADDRESS = "FA:KE:00:00:00:01"
+
+
+def load_fixture(name: str):
+    return json.loads((FIXTURES_PATH / name).read_text())
+
+
+class FakeClient:
+    """Stands in for the BleakClient of the screen, drop() simulates a lost link."""
+
+    def __init__(self, address: str = FAKE_ADDRESS, disconnected_callback=None):
+        self.address = address
+        self.disconnected_callback = disconnected_callback
+        self.is_connected = True
+
+    async def connect(self):
+        self.is_connected = True
+
+    def drop(self):
+        self.is_connected = False
+        if self.disconnected_callback is not None:
+            self.disconnected_callback(self)
+
+
+class FakeConnectionManager:
+    """Records every write and sleeps as long as the BLE link would take to send it."""
+
+    throughput = 2000  # bytes per second
+
+    def __init__(self):
+        self.address = None
+        self.client = FakeClient()
+        self.writes: List[int] = []
+
+    @staticmethod
+    async def scan() -> List[str]:
+        return [FAKE_ADDRESS]
+
+    async def connectByAddress(self, address: str):
+        self.address = address
+        self.client.is_connected = True
+
+    async def connectBySearch(self):
+        await self.connectByAddress(FAKE_ADDRESS)
+
+    async def connect(self):
+        pass
+
+    async def send(self, data, response=False):
+        self.writes.append(len(data))
+        await asyncio.sleep(len(data) / self.throughput)
+
+    @property
+    def bytes_sent(self) -> int:
+        return sum(self.writes)
+
+
+class FakeImage:
+    conn = None
+
+    async def setMode(self, mode: int = 1):
+        data = bytearray([5, 0, 4, 1, int(mode) % 256])
+        await self.conn.send(data=data)
+        return data
+
+    def _createPayloads(self, png_data: bytes, chunk_size: int = 4096) -> bytearray:
+        # Same framing overhead as idotmatrix: a 9 bytes header for every chunk
+        payloads = bytearray()
+        for start in range(0, len(png_data), chunk_size):
+            payloads.extend(bytes(9) + png_data[start : start + chunk_size])
+        return payloads
+
+    async def uploadUnprocessed(self, file_path: str):
+        data = self._createPayloads(Path(file_path).read_bytes())
+        await self.conn.send(data=data)
+        return data
+
+
+class FakeGif:
+    conn = None
+
+    def _createPayloads(self, gif_data: bytes) -> bytearray:
+        # Same framing overhead as idotmatrix: a 16 bytes header for every chunk
+        payloads = bytearray()
+        for start in range(0, len(gif_data), 4096):
+            payloads.extend(bytes(16) + gif_data[start : start + 4096])
+        return payloads
+
+
+class FakeText:
+    conn = None
+
+    def _StringToBitmaps(self, text: str, font_size: int = 16, font_path=None, **kwargs) -> bytearray:
+        # Same framing as idotmatrix: a 4 bytes separator and a 16x32 bitmap per character
+        bitmaps = bytearray()
+        for _ in text:
+            # Columns 2 to 13 lit, like a glyph centered in its cell
+            bitmaps += b"\x05\xff\xff\xff" + b"\xfc\x3f" * 32
+        return bitmaps
+
+    def _buildStringPacket(self, text_bitmaps: bytearray, speed: int = 95, **kwargs) -> bytearray:
+        # 16 bytes header before the bitmaps
+        return bytearray(16) + text_bitmaps
+
+
+class FakeClock:
+    conn = None
+
+    async def setMode(self, style: int = 1, **kwargs):
+        data = bytearray([8, 0, 6, 1, style])
+        await self.conn.send(data=data)
+        return data
+
+
+class FakeSystem:
+    conn = None
+
+    async def deleteDeviceData(self):
+        data = bytearray([17, 0, 2, 1, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21])
+        await self.conn.send(data=data)
+        return data
+
+
+def install_fake_idotmatrix():
+    module = types.ModuleType("idotmatrix")
+    module.ConnectionManager = FakeConnectionManager
+    module.Image = FakeImage
+    module.Gif = FakeGif
+    module.Text = FakeText
+    module.Clock = FakeClock
+    module.System = FakeSystem
+    sys.modules["idotmatrix"] = module
+
+
+class FakeResponse:
+    def __init__(self, body: bytes):
+        self.body = body
+        self.status = 200
+        self.headers = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def read(self) -> bytes:
+        return self.body
+
+    async def json(self):
+        return json.loads(self.body)
+
+
+class FakeSession:
+    """Answers the CoinGecko and YouTube requests with the recorded fixtures."""
+
+    closed = False
+
+    def __init__(self):
+        self.responses = {
+            "/coins/markets": json.dumps(load_fixture("coingecko_markets.json")).encode(),
+            "/youtube/": json.dumps(load_fixture("youtube_channels.json")).encode(),
+        }
+        # Full /coins/{id} responses, as the crypto tile requested them one coin at a time before /coins/markets
+        for coin, payload in load_fixture("coingecko_coins.json").items():
+            self.responses[f"/coins/{coin}"] = json.dumps(payload).encode()
+        self.requests = 0
+        self.bytes_received = 0
+
+    def get(self, url: str) -> FakeResponse:
+        for path, body in self.responses.items():
+            if path in url:
+                self.requests += 1
+                self.bytes_received += len(body)
+                return FakeResponse(body)
+        raise ValueError(f"No fixture for {url}")
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeYahooFinance:
+    """Replaces yf.download and yf.Ticker with the recorded closes, aligned to the current hour."""
+
+    def __init__(self):
+        self.fixture = load_fixture("yfinance.json")
+        self.downloads = 0
+
+    def download(self, tickers, interval: str = "1d", **kwargs):
+        import pandas as pd
+
+        self.downloads += 1
+        current_time = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        frames = {}
+        for ticker in tickers:
+            if interval == "1h":
+                closes = self.fixture[ticker]["hourly_close"]
+                step = timedelta(hours=1)
+                end = current_time
+            else:
+                closes = self.fixture[ticker]["daily_close"]
+                step = timedelta(days=1)
+                end = current_time.replace(hour=0) - timedelta(days=1)
+            index = pd.DatetimeIndex([end - step * (len(closes) - 1 - i) for i in range(len(closes))])
+            frames[ticker] = pd.DataFrame({"Close": closes}, index=index)
+        return pd.concat(frames, axis=1)
+
+    def Ticker(self, ticker: str):  # noqa: N802
+        return types.SimpleNamespace(info={"shortName": self.fixture[ticker]["short_name"]})
@@ -1,20 +1,34 @@
 import argparse
 import asyncio
 import logging
+import secrets
 import sys
 import time
+from typing import Any, Dict, Optional, Set
 
 import colorlog
 
 # idotmatrix imports
-from .screen import IDotMatrixScreen
+from .cache import snapshot_store
+from .dedupe import seen_payments
+from .display import DisplayScheduler
+from .playlist import Device, Playlist
+from .http_client import http_client
+from .ingress import INGRESS_PROCESS, IngressListener, QueueSink, ingress_router, run_ingress_process, set_sink
+from .messages import MessageQueue
+from .metrics import registry
+from .monitor import LoopLagMonitor
+from .ratelimit import rate_limiter
+from .refresher import RefreshScheduler
+from .resource_cache import resource_cache
+from .screen import IDotMatrixScreen, new_connection
 from .settings import settings
-from .tiles import Crypto, YoutubeViewers, Message, Finance
 
-from fastapi import FastAPI, BackgroundTasks, UploadFile, File, status, Request
+from fastapi import FastAPI, BackgroundTasks, Body, UploadFile, File, Header, status, Request
 from fastapi.exceptions import HTTPException
+from fastapi.responses import PlainTextResponse
 
-from pydantic import BaseModel # nytt
+from pydantic import BaseModel, ValidationError # nytt
 import json # nytt
 
 import os
@@ -35,8 +49,9 @@ def parse_arguments(args):
     )
     parser.add_argument(
         "--address",
-        action="store",
-        help="Bluetooth address of the device to connect",
+        action="append",
+        help="Bluetooth address of the device to connect, repeat it or split by commas to drive several "
+        "devices, or auto to use all the devices found",
     )
     parser.add_argument(
         "--test",
@@ -57,178 +72,174 @@ def parse_arguments(args):
     return arguments
 
 server_app = FastAPI()
-message_queue = asyncio.Queue()
-
-# Define a route for receiving messages
-@server_app.post("/message")
-async def receive_message(message: str):
-    await message_queue.put(message)
-    return {"message": "Received"}
-
-class WebhookPayload(BaseModel):
-    payment_hash: str
-    payment_request: str
-    amount: float
-    comment: str = None
-    webhook_data: dict = None
-
-    lnurlp: str
-    body: dict = {}
-    headers: dict = {}
-
-@server_app.post("/lnbits")
-async def handle_lnbits_webhook(request: Request, payload: WebhookPayload):
-    logger = logging.getLogger("pixelart-tracker")
-    
+message_queue = MessageQueue()
+loop_monitor = LoopLagMonitor()
+# Tiles of every device, set once the devices are connected
+playlist: Optional[Playlist] = None
+
+# /message and /lnbits, served here unless they run in their own worker processes
+server_app.include_router(ingress_router)
+message_sink = QueueSink(message_queue)
+set_sink(message_sink)
+
+registry.gauge("pixeltracker_message_queue_depth", "Messages waiting to be shown.", message_queue.qsize)
+registry.gauge("pixeltracker_loop_lag_seconds", "Last measured event loop lag.", lambda: loop_monitor.last_lag)
+registry.gauge(
+    "pixeltracker_resource_cache_hits", "Fonts and backgrounds served from memory.", lambda: resource_cache.hits
+)
+registry.gauge(
+    "pixeltracker_resource_cache_misses", "Fonts and backgrounds loaded from disk.", lambda: resource_cache.misses
+)
+
+@server_app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@server_app.post("/admin/reload")
+async def reload_config(overrides: Dict[str, Any] = Body(default={}), x_admin_token: str = Header(default="")):
+    """reloads the settings, optionally overriding some of them, and rebuilds the tiles that changed"""
+    # Disabled without a token, the server listens on all the interfaces
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin endpoints are disabled")
+    if not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+    if playlist is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Not started yet")
     try:
-        # Log the incoming request
-        logger.info(f"Received webhook: {payload.dict()}")
-        
-        # Extract headers from the request
-        headers = request.headers
-        
-        # Convert headers to a dictionary
-        headers_dict = {k: v for k, v in headers.items()}
-        
-        # Extract product type from header data if present
-        # Try with LNbits Pay Links Webhook headers: {"product": "cookie"}
-        product = headers_dict.get("product", "")
-
-        # Convert millisats to sats
-        amount_in_sats = payload.amount / 1000.0
-
-        # Avoid characters and emojis the font does not support
-        if payload.comment is not None:
-            message = payload.comment
-            description = message.encode('iso-8859-1', 'ignore').decode('iso-8859-1')
-        else:
-            description = ""
-            
-        if product == "donation":
-            message = " Thank you! %1.0f sats %s! %s" % ( amount_in_sats, "received", description) 
-        elif len(product) > 0: 
-            product = product + " bought. "
-            message = product + "%1.0f sats %s! %s" % ( amount_in_sats, "received", description)
-        
-        message = message.upper()
-        logger.info(f"Message to display: {message}")
-        await message_queue.put(message)
-        
-        # Return a success response
-        return {"status": "success", "message": "Webhook processed"}
+        return await playlist.reload(overrides)
+    except ValidationError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=e.errors())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
 
-    except Exception as e:
-        logger.error(f"Error processing webhook: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+@server_app.get("/queue")
+async def queue_stats():
+    return message_queue.stats()
 
 # Define a function to run the FastAPI server
-async def run_server():
+async def run_server(port: int = PORT):
     import uvicorn
-    config = uvicorn.Config(server_app, host="0.0.0.0", port=9191)
+    config = uvicorn.Config(server_app, host="0.0.0.0", port=port)
     server = uvicorn.Server(config)
     await server.serve()
 
-async def show_message(idms, message_tile):
-    while True:
-        run_tile_task = asyncio.create_task(message_tile.run())
-        await run_tile_task
+def log_stats(idms):
+    # Once per rotation of every device, the same numbers are exported on /metrics
+    logging.getLogger("pixelart-tracker").debug(
+        f"Cycle stats: frames {idms.frame_stats}, loop lag {loop_monitor.stats()}, "
+        f"API quota {rate_limiter.report()}, queue {message_queue.stats()}, "
+        f"resource cache {resource_cache.stats()}, payments seen {seen_payments.stats()}"
+    )
 
-        # Pre-defined text-speed, will vary with font and text speed settings
-        chars_per_second = 6.912/26
-        
-        # Set a delay to enable showing the received message twice
-        delay = 2.0*chars_per_second*len(message_tile.message)
-        
-        if delay < 7: # Show each message at least 7 seconds
-            delay = 7
-        elif delay > 60: # Don't show any message more than 60 seconds
-            delay = 60
-
-        # Wait for 5 seconds and check for new messages
-        start_time = asyncio.get_running_loop().time()
-        try:
-            new_message = await asyncio.wait_for(message_queue.get(), timeout=5)
-            new_message = new_message[:80]
-            new_message_tile = Message(idms, new_message, test = False)
-            del message_tile
-            message_tile = new_message_tile
-        except asyncio.TimeoutError:
-            # No new message arrived, calculate the remaining time and sleep
-            elapsed_time = asyncio.get_running_loop().time() - start_time
-            remaining_time = delay - elapsed_time
-            if remaining_time > 0:
-                await asyncio.sleep(remaining_time)
-            break
-        message_queue.task_done()
 
-    
-async def run():
-    idms = IDotMatrixScreen()
+async def reload_on_signal():
+    try:
+        await playlist.reload()
+    except Exception as e:
+        logging.getLogger("pixelart-tracker").error(f"Could not reload the settings: {e}")
+
+
+async def get_addresses(idms, arguments):
+    addresses = []
+    for argument in arguments or []:
+        addresses.extend(address.strip() for address in argument.split(",") if address.strip())
+
+    if any(address.lower() == "auto" for address in addresses):
+        found = await idms.discover()
+        if not found:
+            logging.getLogger("pixelart-tracker").error("no devices found")
+            quit()
+        addresses = [address for address in addresses if address.lower() != "auto"]
+        addresses.extend(address for address in found if address not in addresses)
+    return addresses
 
+
+async def run():
     args = parse_arguments(sys.argv[1:])
 
+    idms = IDotMatrixScreen()
+
     if args.scan:
         await idms.scan()
         quit()
 
-    await idms.connect(args.address)
+    addresses = await get_addresses(idms, args.address)
+    if not addresses:
+        await idms.connect(None)
+
+    # The first device uses the shared idotmatrix connection, the others get their own
+    screens = [idms] + [IDotMatrixScreen(new_connection()) for _ in addresses[1:]]
+    for screen, address in zip(screens, addresses):
+        await screen.connect(address)
+        await screen.reset()
+
+    # Reconnect to the devices when the Bluetooth link drops
+    supervisor_tasks = [asyncio.create_task(screen.supervisor.run()) for screen in screens]
+
+    ingress_task = listener = None
+    if settings.INGRESS_MODE == INGRESS_PROCESS:
+        # Webhooks are answered by other processes even while this loop renders or uploads
+        listener = IngressListener(message_sink)
+        await listener.start()
+        ingress_task = asyncio.create_task(run_ingress_process("0.0.0.0", PORT))
+        server_task = asyncio.create_task(run_server(settings.INGRESS_ADMIN_PORT))
+    else:
+        server_task = asyncio.create_task(run_server())
+
+    # Tiles of different devices share the same data providers
+    refresher = RefreshScheduler()
+    global playlist
+    playlist = Playlist(refresher, args.test)
+    for index, (screen, address) in enumerate(zip(screens, addresses)):
+        scheduler = DisplayScheduler(
+            screen,
+            playlist.build(screen, address),
+            # Messages are shown on the first device
+            messages=message_queue if index == 0 else None,
+            on_cycle=lambda screen=screen: log_stats(screen),
+        )
+        playlist.add_device(Device(screen, address, scheduler))
+
+    await http_client.start()
+
+    # Show the data of the previous run right away, even if the upstream APIs are down
+    refresher.restore()
+    refresher_task = asyncio.create_task(refresher.run())
+    cache_task = asyncio.create_task(snapshot_store.run())
+    seen_task = asyncio.create_task(seen_payments.run())
+    monitor_task = asyncio.create_task(loop_monitor.run())
+
+    # Reload the settings and the tiles without reconnecting with kill -HUP
+    loop = asyncio.get_running_loop()
+    # The loop only keeps weak references to the tasks, keep the reloads alive until they finish
+    reload_tasks: Set[asyncio.Task] = set()
+
+    def on_sighup():
+        task = asyncio.create_task(reload_on_signal())
+        reload_tasks.add(task)
+        task.add_done_callback(reload_tasks.discard)
+
+    loop.add_signal_handler(signal.SIGHUP, on_sighup)
 
-    await idms.reset()
+    try:
+        await asyncio.gather(*(device.scheduler.run() for device in playlist.devices))
+    finally:
+        loop.remove_signal_handler(signal.SIGHUP)
+        refresher_task.cancel()
+        monitor_task.cancel()
+        refresher.close()
+        cache_task.cancel()
+        snapshot_store.close()
+        seen_task.cancel()
+        seen_payments.close()
+        for supervisor_task in supervisor_tasks:
+            supervisor_task.cancel()
+        server_task.cancel()
+        if ingress_task is not None:
+            ingress_task.cancel()
+            await listener.close()
+        await http_client.close()
 
-    server_task = asyncio.create_task(run_server())
-    
-    tile_collection = str(settings.TILES).split(",")
-    tiles = []
-    for tile in tile_collection:
-        if tile == "yt":
-            instance = YoutubeViewers(idms, args.test)
-            tiles.append(instance)
-        elif tile == "crypto":
-            crypto_tiles = str(settings.CRYPTO_CURRENCIES).split(",")
-            for crypto_tile in crypto_tiles:
-                instance = Crypto(idms, crypto_tile, args.test)
-                tiles.append(instance)
-        elif tile == "finance":
-            finance_tiles = str(settings.FINANCE_TICKERS).split(",")
-            for finance_tile in finance_tiles:
-                instance = Finance(idms, finance_tile, args.test)
-                tiles.append(instance)
-            
-    what_tile = 0
-
-    while True:
-        if message_queue.empty():
-            # Run a tile if there are no messages
-            run_tile_task = asyncio.create_task(tiles[what_tile % len(tiles)].run())
-            what_tile = what_tile + 1 # next tile on the next run... 
-            try:
-                # Wait for 30 seconds or until a message arrives
-                message = await asyncio.wait_for(message_queue.get(), timeout=30)
-                
-                # Cancel the tile task if a message arrives
-                run_tile_task.cancel()
-                
-                # Can't send message to screen if larger than 80 to 88
-                # characters Perhaps need to wait for responses in the
-                # idotmatrix text module where we chunk?
-                # I.e. around self.conn.send(data=chunk)
-                message = message[:80]
-                message_tile = Message(idms, message, test = False)
-            
-                await show_message(idms, message_tile)
-                del message_tile
-            except asyncio.TimeoutError:
-                print("no message arrived within 30 seconds")
-                pass
-        else:
-            await asyncio.sleep(0.1)
-            # Get the message from the queue
-            message = await message_queue.get()
-            message = message[:80]
-            message_tile = Message(idms, message, test = False)
-            await show_message(idms, message_tile)
-
-    await server_task
 
 def main():
     
@@ -0,0 +1,85 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+class SnapshotStore:
+    """Persists the last good snapshot of every data source, writes are batched to spare the SD card."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self.db: Optional[sqlite3.Connection] = None
+        self.pending: Dict[str, Tuple[str, float]] = {}
+
+    def open(self):
+        if self.db is not None:
+            return
+        if self.path is None:
+            self.path = Path(settings.CACHE_DIR).expanduser() / "snapshots.sqlite"
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(self.path))
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots (key TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL)"
+            )
+            self.db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Snapshot cache {self.path} is not available: {e}")
+            self.db = None
+
+    def load(self, key: str) -> Optional[Tuple[dict, float]]:
+        if key in self.pending:
+            data, fetched_at = self.pending[key]
+            return json.loads(data), fetched_at
+
+        self.open()
+        if self.db is None:
+            return None
+        row = self.db.execute("SELECT data, fetched_at FROM snapshots WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, key: str, data: dict, fetched_at: Optional[float] = None):
+        """keeps the snapshot in memory until the next flush"""
+        self.pending[key] = (json.dumps(data), fetched_at or time.time())
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.open()
+        if self.db is None:
+            return
+        rows = [(key, data, fetched_at) for key, (data, fetched_at) in self.pending.items()]
+        try:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO snapshots (key, data, fetched_at) VALUES (?, ?, ?)",
+                rows,
+            )
+            self.db.commit()
+            self.pending.clear()
+            logger.debug(f"Saved {len(rows)} snapshots to {self.path}")
+        except sqlite3.Error as e:
+            logger.warning(f"Could not save snapshots to {self.path}: {e}")
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(settings.CACHE_FLUSH_INTERVAL)
+            self.flush()
+
+
+snapshot_store = SnapshotStore()
@@ -0,0 +1,204 @@
+import logging
+import string
+from dataclasses import dataclass
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from .layout import SCREEN_WIDTH, FittedText, text_layout
+from .resource_cache import PIXEL_FONT, PIXEL_FONT_SIZE, resource_cache
+
+logger = logging.getLogger("pixelart-tracker")
+
+Color = Tuple[int, int, int]
+
+WHITE: Color = (255, 255, 255)
+GREEN: Color = (0, 255, 0)
+RED: Color = (255, 0, 0)
+
+ALIGN_LEFT = "left"
+ALIGN_CENTER = "center"
+
+
+@dataclass(frozen=True)
+class TextLine:
+    text: str
+    y: int
+    color: Color = WHITE
+    align: str = ALIGN_CENTER
+    # Only used by left aligned lines
+    x: int = 0
+
+
+@dataclass(frozen=True)
+class Sparkline:
+    values: Sequence[float]
+    y: int
+    height: int
+    color: Color = WHITE
+    x: int = 0
+    width: int = SCREEN_WIDTH
+    # Share of the chart drawn from the left, to animate it
+    reveal: float = 1.0
+
+
+@dataclass(frozen=True)
+class Layout:
+    """What a tile shows: a background, lines of text drawn with the pixel font and charts."""
+
+    background: str
+    lines: Sequence[TextLine] = ()
+    charts: Sequence[Sparkline] = ()
+
+
+@dataclass(frozen=True)
+class Glyph:
+    # Coverage of every pixel of the character, 0 to 255
+    alpha: np.ndarray
+    # Position of the top left pixel of alpha, from the pen position
+    offset_x: int
+    offset_y: int
+    advance: int
+
+
+def trend_color(change, unchanged: Color = GREEN) -> Color:
+    """green when the value went up, red when it went down"""
+    if change > 0:
+        return GREEN
+    if change < 0:
+        return RED
+    return unchanged
+
+
+class Compositor:
+    """Builds frames from layouts with array blits of glyphs rasterized only once per character."""
+
+    def __init__(self, font_name: str = PIXEL_FONT, font_size: int = PIXEL_FONT_SIZE):
+        self.font_name = font_name
+        self.font_size = font_size
+        self.glyphs: Dict[str, Glyph] = {}
+        self.backgrounds: Dict[str, np.ndarray] = {}
+
+    def _rasterize(self, char: str) -> Glyph:
+        font = resource_cache.font(self.font_name, self.font_size)
+        # Draw the character on its own with PIL, so blits match what draw.text would have drawn
+        pad = self.font_size * 2
+        canvas = Image.new("L", (pad * 3, pad * 3))
+        ImageDraw.Draw(canvas).text((pad, pad), char, fill=255, font=font)
+        pixels = np.asarray(canvas)
+
+        advance = round(font.getlength(char))
+        rows = np.flatnonzero(pixels.any(axis=1))
+        columns = np.flatnonzero(pixels.any(axis=0))
+        if rows.size == 0:  # Blank, e.g. a space
+            return Glyph(np.zeros((0, 0), dtype=np.uint8), 0, 0, advance)
+
+        top, bottom = rows[0], rows[-1] + 1
+        left, right = columns[0], columns[-1] + 1
+        alpha = np.ascontiguousarray(pixels[top:bottom, left:right])
+        return Glyph(alpha, int(left) - pad, int(top) - pad, advance)
+
+    def glyph(self, char: str) -> Glyph:
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            glyph = self.glyphs[char] = self._rasterize(char)
+        return glyph
+
+    def background(self, name: str) -> np.ndarray:
+        background = self.backgrounds.get(name)
+        if background is None:
+            image = resource_cache.background(name).convert("RGB")
+            background = self.backgrounds[name] = np.array(image, dtype=np.uint8)
+            background.flags.writeable = False
+        return background
+
+    def preload(self, chars: str = string.printable):
+        for char in chars:
+            if char.isprintable():
+                self.glyph(char)
+        logger.debug(f"Rasterized {len(self.glyphs)} glyphs")
+
+    def fit(self, line: TextLine) -> FittedText:
+        """text actually drawn for a line and where, once it has been made to fit the screen"""
+        metrics = text_layout.metrics(self.font_name, self.font_size)
+        if line.align == ALIGN_CENTER:
+            return text_layout.fit(line.text, metrics=metrics)
+        fitted = text_layout.fit(line.text, SCREEN_WIDTH - line.x, metrics=metrics)
+        return FittedText(fitted.text, fitted.width, fitted.tracking, line.x)
+
+    def _text_mask(self, mask: np.ndarray, text: str, x: int, y: int, tracking: int = 0):
+        """blits the coverage of every character of a text into a frame sized mask"""
+        height, width = mask.shape
+        pen = x
+        for char in text:
+            glyph = self.glyph(char)
+            top = y + glyph.offset_y
+            left = pen + glyph.offset_x
+            pen += glyph.advance + tracking
+
+            glyph_height, glyph_width = glyph.alpha.shape
+            # Clip the glyph to the frame
+            top_clip, left_clip = max(0, -top), max(0, -left)
+            bottom, right = min(height, top + glyph_height), min(width, left + glyph_width)
+            if top + top_clip >= bottom or left + left_clip >= right:
+                continue
+            target = mask[top + top_clip : bottom, left + left_clip : right]
+            source = glyph.alpha[top_clip : top_clip + target.shape[0], left_clip : left_clip + target.shape[1]]
+            np.maximum(target, source, out=target)
+
+    @staticmethod
+    def _chart_mask(mask: np.ndarray, chart: Sparkline):
+        """draws a chart as a line joining one point per column, the highest value on top"""
+        height, width = mask.shape
+        columns = int(round(chart.width * min(max(chart.reveal, 0.0), 1.0)))
+        columns = min(columns, width - chart.x)
+        if len(chart.values) < 2 or columns <= 0 or chart.height <= 0:
+            return
+
+        values = np.asarray(chart.values, dtype=float)
+        # Resample the series to one value per column of the chart
+        points = np.interp(np.linspace(0, len(values) - 1, chart.width), np.arange(len(values)), values)
+        low, high = points.min(), points.max()
+        scale = (chart.height - 1) / (high - low) if high > low else 0.0
+        rows = np.rint((high - points) * scale).astype(int)[:columns]
+        if high == low:
+            rows[:] = (chart.height - 1) // 2
+
+        # Every column covers the rows between its point and the previous one, so the line has no gaps
+        previous = np.concatenate((rows[:1], rows[:-1]))
+        top, bottom = np.minimum(rows, previous), np.maximum(rows, previous)
+        chart_rows = np.arange(chart.height)[:, None]
+        covered = (chart_rows >= top) & (chart_rows <= bottom)
+
+        visible = min(chart.height, height - chart.y)
+        if visible <= 0:
+            return
+        target = mask[chart.y : chart.y + visible, chart.x : chart.x + columns]
+        np.maximum(target, covered[:visible].astype(np.uint8) * 255, out=target)
+
+    @staticmethod
+    def _blend(frame: np.ndarray, mask: np.ndarray, color: Color) -> np.ndarray:
+        """blends a color over the frame using the mask as alpha"""
+        alpha = mask[..., None].astype(np.uint16)
+        return (frame * (255 - alpha) + np.array(color, dtype=np.uint16) * alpha + 127) // 255
+
+    def compose(self, layout: Layout) -> np.ndarray:
+        frame = self.background(layout.background).astype(np.uint16)
+        mask = np.zeros(frame.shape[:2], dtype=np.uint8)
+        for line in layout.lines:
+            mask.fill(0)
+            fitted = self.fit(line)
+            self._text_mask(mask, fitted.text, fitted.x, line.y, fitted.tracking)
+            frame = self._blend(frame, mask, line.color)
+        for chart in layout.charts:
+            mask.fill(0)
+            self._chart_mask(mask, chart)
+            frame = self._blend(frame, mask, chart.color)
+        return frame.astype(np.uint8)
+
+    def render(self, layout: Layout) -> Image.Image:
+        return Image.fromarray(self.compose(layout), "RGB")
+
+
+compositor = Compositor()
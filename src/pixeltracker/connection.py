@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from bleak.exc import BleakError
+
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+# Errors raised by bleak when the link to the device drops in the middle of a write
+BLE_ERRORS = (BleakError, OSError, EOFError, asyncio.TimeoutError)
+
+Upload = Callable[[], Awaitable[None]]
+
+
+class ConnectionSupervisor:
+    """Watches the BLE link health and reconnects with exponential backoff when it drops."""
+
+    def __init__(self, screen, address: str):
+        self.screen = screen
+        self.address = address
+        self.connected = asyncio.Event()
+        self.lost = asyncio.Event()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        # Only the latest upload is replayed after a reconnection, older ones are stale
+        self.pending: Optional[Upload] = None
+        self.dropped = 0
+        self.reconnects = 0
+
+    def is_connected(self) -> bool:
+        client = getattr(self.screen.conn, "client", None)
+        return bool(client and client.is_connected)
+
+    def link_lost(self, reason: Optional[Exception] = None):
+        if self.connected.is_set():
+            logger.warning(f"Lost connection with the device: {reason or 'disconnected'}")
+        self.connected.clear()
+        self.lost.set()
+
+    def on_disconnect(self, client):
+        """called by bleak when the link drops"""
+        if client is not getattr(self.screen.conn, "client", None):
+            # A client replaced by a reconnection
+            return
+        if self.loop is None:
+            self.link_lost()
+        else:
+            self.loop.call_soon_threadsafe(self.link_lost)
+
+    def defer(self, upload: Upload):
+        if self.pending is not None:
+            self.dropped += 1
+        self.pending = upload
+
+    async def reconnect(self):
+        delay = settings.BLE_RECONNECT_MIN_DELAY
+        while True:
+            try:
+                await self.screen.connect_device(self.address, self.on_disconnect)
+                if self.is_connected():
+                    break
+            except Exception as e:
+                logger.warning(f"Reconnection to the device failed: {e}")
+            logger.info(f"Retrying connection to the device in {delay} seconds")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, settings.BLE_RECONNECT_MAX_DELAY)
+
+        self.reconnects += 1
+        logger.info(
+            f"Reconnected to the device ({self.reconnects} reconnections, {self.dropped} stale uploads dropped)"
+        )
+        # The device may have lost its mode and image while disconnected
+        self.screen.forget_device_state()
+        self.lost.clear()
+        self.connected.set()
+        await self.replay()
+
+    async def replay(self):
+        upload, self.pending = self.pending, None
+        if upload is None:
+            return
+        try:
+            await upload()
+        except BLE_ERRORS as e:
+            self.link_lost(e)
+            self.defer(upload)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        if self.is_connected():
+            self.connected.set()
+        while True:
+            if not self.connected.is_set() or not self.is_connected():
+                self.link_lost()
+                await self.reconnect()
+                continue
+            # No polling: bleak reports the dropped link through on_disconnect, the uploads through link_lost
+            await self.lost.wait()
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+class SeenIndex:
+    """Keys seen in the last ttl seconds, bounded to max_entries, optionally persisted between restarts."""
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        path: Optional[Path] = None,
+        persist: Optional[bool] = None,
+    ):
+        self.ttl = settings.PAYMENT_DEDUPE_TTL if ttl is None else ttl
+        self.max_entries = settings.PAYMENT_DEDUPE_MAX_ENTRIES if max_entries is None else max_entries
+        self.persist = settings.PAYMENT_DEDUPE_PERSIST if persist is None else persist
+        self.path = path
+        self.db: Optional[sqlite3.Connection] = None
+        # Key to wall clock expiry time, oldest first: with a single ttl the expiry order is the insertion order
+        self.entries: "OrderedDict[str, float]" = OrderedDict()
+        self.pending: Dict[str, float] = {}
+        self.loaded = False
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _evict(self, now: float):
+        while self.entries:
+            key, expires_at = next(iter(self.entries.items()))
+            if expires_at > now and len(self.entries) <= self.max_entries:
+                break
+            self.entries.popitem(last=False)
+            self.evicted += 1
+
+    def seen(self, key: str) -> bool:
+        """tells if the key was added less than ttl seconds ago"""
+        self.load()
+        now = time.time()
+        self._evict(now)
+        if key in self.entries:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def add(self, key: str):
+        expires_at = time.time() + self.ttl
+        self.entries[key] = expires_at
+        self.entries.move_to_end(key)
+        if self.persist:
+            self.pending[key] = expires_at
+        self._evict(time.time())
+
+    def open(self):
+        if self.db is not None:
+            return
+        if self.path is None:
+            self.path = Path(settings.CACHE_DIR).expanduser() / "seen.sqlite"
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(self.path))
+            self.db.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+            self.db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Seen index {self.path} is not available: {e}")
+            self.db = None
+
+    def load(self):
+        """restores the keys persisted by a previous run, once"""
+        if self.loaded or not self.persist:
+            return
+        self.loaded = True
+        self.open()
+        if self.db is None:
+            return
+        rows = self.db.execute(
+            "SELECT key, expires_at FROM seen WHERE expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+            (time.time(), self.max_entries),
+        ).fetchall()
+        for key, expires_at in reversed(rows):
+            self.entries.setdefault(key, expires_at)
+        logger.debug(f"Restored {len(rows)} seen keys from {self.path}")
+
+    def flush(self):
+        if not self.pending:
+            return
+        self.open()
+        if self.db is None:
+            return
+        try:
+            self.db.executemany("INSERT OR REPLACE INTO seen (key, expires_at) VALUES (?, ?)", self.pending.items())
+            self.db.execute("DELETE FROM seen WHERE expires_at <= ?", (time.time(),))
+            self.db.commit()
+            logger.debug(f"Saved {len(self.pending)} seen keys to {self.path}")
+            self.pending.clear()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not save seen keys to {self.path}: {e}")
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    async def run(self):
+        if not self.persist:
+            return
+        while True:
+            await asyncio.sleep(settings.CACHE_FLUSH_INTERVAL)
+            self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+
+# payment_hash of the LNbits payments already queued, LNbits retries a webhook until it gets a 2xx
+seen_payments = SeenIndex()
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+from typing import Callable, List, Optional, Union
+
+from .messages import PRIORITY_PAYMENT, MessageQueue, QueuedMessage
+from .metrics import TILE_ERRORS
+from .screen import IDotMatrixScreen
+from .settings import settings
+from .tiles import IDotMatrixTile, Message, RenderedTile
+
+logger = logging.getLogger("pixelart-tracker")
+
+ROTATING = "rotating"
+SHOWING_MESSAGE = "message"
+
+MESSAGE_MIN_TIME = 7  # Show each message at least 7 seconds
+MESSAGE_MAX_TIME = 60  # Don't show any message more than 60 seconds
+# Any new message replaces the current one during its first seconds, only more important ones afterwards
+MESSAGE_REPLACE_TIME = 5
+
+
+class RenderFailed:
+    """Stands for the frames of a tile that could not be rendered."""
+
+
+RENDER_FAILED = RenderFailed()
+
+
+def message_tile_for(idms: IDotMatrixScreen, message: QueuedMessage) -> Message:
+    # The text is sent in acknowledged chunks, only the length field of the packet limits it
+    return Message(idms, message.text[: settings.MESSAGE_MAX_CHARS], test=False, priority=message.priority)
+
+
+def scroll_speed() -> float:
+    """pixels per second the device scrolls a text at, proportional to TEXT_SPEED"""
+    return settings.TEXT_PIXELS_PER_SECOND * settings.TEXT_SPEED / 100
+
+
+def message_duration(text: str, width: Optional[int] = None) -> float:
+    """time to show a message, from the width of the text rendered by the device when known"""
+    if width is None:
+        width = 16 * len(text)
+    # The text scrolls in from the right edge and out past the left one
+    scroll = (width + 32) / scroll_speed()
+    # Show the received message twice, a long one at least once whole
+    return min(max(2.0 * scroll, MESSAGE_MIN_TIME), max(MESSAGE_MAX_TIME, scroll))
+
+
+class DisplayScheduler:
+    """Shows the tiles and messages of a device, driven only by timers, message arrivals and link changes."""
+
+    def __init__(
+        self,
+        idms: IDotMatrixScreen,
+        tiles: List[IDotMatrixTile],
+        messages: Optional[MessageQueue] = None,
+        refresh_time: Optional[float] = None,
+        on_cycle: Optional[Callable[[], None]] = None,
+    ):
+        self.idms = idms
+        self.tiles = tiles
+        self.messages = messages
+        self.refresh_time = settings.REFRESH_TIME if refresh_time is None else refresh_time
+        self.on_cycle = on_cycle
+        self.state = ROTATING
+        # Index of the next tile to show
+        self.position = 0
+        # Back buffer: the tile being rendered for the next slot
+        self.back: Optional[asyncio.Task] = None
+        self.upload: Optional[asyncio.Task] = None
+        self.message_task: Optional[asyncio.Task] = None
+        self.link_task: Optional[asyncio.Task] = None
+        self.tiles_changed = asyncio.Event()
+        self.link_up = True
+        self.late = 0
+        self.wakeups = 0
+        # Tiles in a row that could not be rendered
+        self.failures = 0
+
+    def set_tiles(self, tiles: List[IDotMatrixTile]):
+        """replaces the tiles of the rotation, the tile on screen stays until the next slot"""
+        self.tiles = tiles
+        if tiles:
+            self.position %= len(tiles)
+        self.tiles_changed.set()
+
+    def tile_at(self, position: int) -> IDotMatrixTile:
+        return self.tiles[position % len(self.tiles)]
+
+    def _prepare(self, position: int) -> asyncio.Task:
+        self.back = asyncio.create_task(self.prepare(self.tile_at(position)))
+        return self.back
+
+    @staticmethod
+    async def prepare(tile: IDotMatrixTile) -> Union[RenderedTile, RenderFailed, None]:
+        """renders a tile, an unavailable upstream must not stop the rotation"""
+        try:
+            return await tile.prepare()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            TILE_ERRORS.inc(tile=tile.key)
+            logger.error(f"Error rendering {tile.key}: {e}")
+            return RENDER_FAILED
+
+    async def _shielded(self, upload, key: str):
+        """runs an upload that goes on even if the display is cancelled meanwhile"""
+        self.upload = asyncio.create_task(upload)
+        try:
+            await asyncio.shield(self.upload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            TILE_ERRORS.inc(tile=key)
+            logger.error(f"Error showing {key}: {e}")
+
+    async def show(self, tile: IDotMatrixTile, rendered: RenderedTile):
+        await self._shielded(tile.show(rendered), tile.key)
+
+    async def show_message(self, message_tile: Message):
+        await self._shielded(message_tile.run(), message_tile.key)
+
+    async def settle(self):
+        """waits for the upload in progress, so the device is never left with half a frame"""
+        if self.upload is not None and not self.upload.done():
+            await asyncio.wait([self.upload])
+
+    def _listen(self, max_priority: Optional[int] = None, enabled: bool = True):
+        """waits for the next message, or only for the messages important enough to preempt the current one"""
+        task = self.message_task
+        if task is not None and task.done() and not task.cancelled():
+            # Already received, it is handled on the next wake up
+            return
+        if task is not None:
+            task.cancel()
+        self.message_task = None
+        if self.messages is not None and enabled:
+            self.message_task = asyncio.create_task(self.messages.get(max_priority=max_priority))
+
+    def _watch_link(self):
+        """waits for the link to drop while it is up, and for the reconnection while it is down"""
+        supervisor = self.idms.supervisor
+        if supervisor is None:
+            return
+        event = supervisor.lost if self.link_up else supervisor.connected
+        self.link_task = asyncio.create_task(event.wait())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        supervisor = self.idms.supervisor
+        self.link_up = supervisor is None or supervisor.connected.is_set()
+        slot_at = loop.time()
+        window_at: Optional[float] = None
+        end_at: Optional[float] = None
+        message_tile: Optional[Message] = None
+        front = self._prepare(self.position) if self.tiles else None
+        self._listen()
+        self._watch_link()
+        self.tiles_changed.clear()
+        changed_task = asyncio.create_task(self.tiles_changed.wait())
+
+        try:
+            while True:
+                waiting = {task for task in (self.message_task, self.link_task, changed_task) if task is not None}
+                deadline = None
+                if self.state == ROTATING and self.link_up and front is not None:
+                    if loop.time() >= slot_at:
+                        # The slot has begun but the tile is still rendering
+                        waiting.add(front)
+                    else:
+                        deadline = slot_at
+                elif self.state == SHOWING_MESSAGE:
+                    deadline = min(at for at in (window_at, end_at) if at is not None)
+
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                self.wakeups += 1
+                now = loop.time()
+
+                if changed_task in done:
+                    # The settings were reloaded, render the next tile of the new rotation instead
+                    self.tiles_changed.clear()
+                    changed_task = asyncio.create_task(self.tiles_changed.wait())
+                    if front is not None:
+                        front.cancel()
+                    front = self._prepare(self.position) if self.tiles else None
+
+                if self.link_task in done:
+                    self.link_up = not self.link_up
+                    logger.info(
+                        "Device link up, display resumed" if self.link_up else "Device link down, display paused"
+                    )
+                    self._watch_link()
+                    if self.link_up:
+                        # Show fresh data right away instead of what was rendered before the link dropped
+                        slot_at = now
+
+                # Messages first, they preempt the tiles deterministically
+                if self.message_task in done:
+                    message = self.message_task.result()
+                    self.message_task = None
+                    if self.state == ROTATING:
+                        await self.settle()
+                    message_tile = message_tile_for(self.idms, message)
+                    self.messages.task_done()
+                    self.state = SHOWING_MESSAGE
+                    await self.show_message(message_tile)
+                    now = loop.time()
+                    window_at = now + MESSAGE_REPLACE_TIME
+                    end_at = now + message_duration(message_tile.message, message_tile.rendered_width)
+                    self._listen()
+
+                if self.state == SHOWING_MESSAGE:
+                    if window_at is not None and now >= window_at:
+                        window_at = None
+                        # Nothing preempts a payment
+                        preemptible = message_tile.priority > PRIORITY_PAYMENT
+                        self._listen(max_priority=message_tile.priority - 1, enabled=preemptible)
+                    if now >= end_at:
+                        self.state = ROTATING
+                        window_at = end_at = message_tile = None
+                        slot_at = now
+                        self._listen()
+
+                if self.state == ROTATING and self.link_up and front is not None and front.done() and now >= slot_at:
+                    rendered = front.result()
+                    if now - slot_at > 1:
+                        self.late += 1
+                        logger.debug(f"{self.tile_at(self.position).key} was rendered {now - slot_at:.2f}s late")
+                    tile = self.tile_at(self.position)
+                    self.position += 1
+                    # Render the next tile while this one is on screen
+                    front = self._prepare(self.position)
+                    failed = rendered is RENDER_FAILED
+                    self.failures = self.failures + 1 if failed else 0
+                    if rendered is not None and not failed:
+                        await self.show(tile, rendered)
+                    if failed and self.failures < len(self.tiles):
+                        # Don't leave the previous frame up for the whole slot, show the next tile once rendered
+                        slot_at = now
+                    else:
+                        # Cut over on the rotation boundary, unless this tile was late
+                        slot_at = max(slot_at, now) + self.refresh_time
+
+                    if self.on_cycle is not None and self.position % len(self.tiles) == 0:
+                        self.on_cycle()
+        finally:
+            for task in (self.back, self.message_task, self.link_task, changed_task):
+                if task is not None:
+                    task.cancel()
+            self.back = self.message_task = self.link_task = None
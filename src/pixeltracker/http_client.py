@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .metrics import STAGE_SECONDS, UPSTREAM_ERRORS
+from .ratelimit import parse_retry_after, rate_limiter
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+class HttpClient:
+    """Application wide HTTP client, keeps connections alive between tile refreshes."""
+
+    session: Optional[aiohttp.ClientSession] = None
+
+    def __init__(self):
+        # Requests being made right now, identical requests wait for the same response
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def start(self):
+        if self.session and not self.session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_SIZE,
+            limit_per_host=settings.HTTP_POOL_SIZE_PER_HOST,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+            use_dns_cache=True,
+        )
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=settings.HTTP_CONNECT_TIMEOUT,
+            sock_read=settings.HTTP_READ_TIMEOUT,
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        logger.debug("HTTP client started")
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+            logger.debug("HTTP client closed")
+        self.session = None
+
+    async def get_json(self, url: str) -> dict:
+        task = self.in_flight.get(url)
+        if task is None:
+            task = asyncio.create_task(self._get_json(url))
+            self.in_flight[url] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(url, None))
+        else:
+            self.coalesced += 1
+            logger.debug("Joining an identical request in flight")
+        # A cancelled caller must not cancel the request other callers wait for
+        return await asyncio.shield(task)
+
+    async def _get_json(self, url: str) -> dict:
+        # Allows tiles to be used without the app lifecycle, e.g. from scripts
+        if self.session is None or self.session.closed:
+            await self.start()
+
+        limiter = rate_limiter.for_url(url)
+        if limiter is not None:
+            # Raises RateLimited when the budget is spent, the refresher tries again later
+            limiter.acquire()
+
+        host = urlparse(url).hostname
+        try:
+            with STAGE_SECONDS.time(stage="fetch", source=host):
+                async with self.session.get(url) as response:
+                    if limiter is not None and response.status in (429, 503):
+                        limiter.retry_after(parse_retry_after(response.headers.get("Retry-After")))
+                    response.raise_for_status()
+                    return await response.json()
+        except Exception:
+            UPSTREAM_ERRORS.inc(upstream=host)
+            raise
+
+
+http_client = HttpClient()
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+from pathlib import Path
+from typing import Optional, Set
+
+from fastapi import APIRouter, FastAPI, Request, status
+from fastapi.exceptions import HTTPException
+from pydantic import BaseModel
+
+from .dedupe import SeenIndex, seen_payments
+from .messages import PRIORITY_PAYMENT, MessageQueue, QueuedMessage
+from .metrics import PAYMENT_DUPLICATES
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+# The HTTP server runs on the display event loop, or in its own worker processes
+INGRESS_INLINE = "inline"
+INGRESS_PROCESS = "process"
+
+QUEUED = "queued"
+DUPLICATE = "duplicate"
+INVALID = "invalid"
+
+
+class IngressUnavailable(Exception):
+    pass
+
+
+def socket_path() -> Path:
+    if settings.INGRESS_SOCKET:
+        return Path(settings.INGRESS_SOCKET).expanduser()
+    return Path(settings.CACHE_DIR).expanduser() / "ingress.sock"
+
+
+class MessageSink:
+    """Where the HTTP ingress delivers the messages it receives."""
+
+    async def submit(self, message: QueuedMessage, key: Optional[str] = None) -> str:
+        """delivers a message, key identifies a payment so its repeated webhooks are only shown once"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class QueueSink(MessageSink):
+    """Puts the messages straight into the display queue, skipping the payments already queued."""
+
+    def __init__(self, queue: MessageQueue, seen: Optional[SeenIndex] = None):
+        self.queue = queue
+        self.seen = seen_payments if seen is None else seen
+
+    def accept(self, message: QueuedMessage, key: Optional[str] = None) -> str:
+        if key is not None and self.seen.seen(key):
+            PAYMENT_DUPLICATES.inc()
+            logger.debug(f"Ignoring repeated webhook for payment {key}")
+            return DUPLICATE
+        self.queue.put_nowait(message)
+        # No await since the lookup, a concurrent retry can't slip in between
+        if key is not None:
+            self.seen.add(key)
+        return QUEUED
+
+    async def submit(self, message: QueuedMessage, key: Optional[str] = None) -> str:
+        return self.accept(message, key)
+
+
+class SocketSink(MessageSink):
+    """Sends the messages to the display process over its Unix socket, one at a time per worker."""
+
+    def __init__(self, path: Path, timeout: Optional[float] = None):
+        self.path = path
+        self.timeout = settings.INGRESS_TIMEOUT if timeout is None else timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.lock = asyncio.Lock()
+
+    def _reset(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def _send(self, line: bytes) -> str:
+        async with self.lock:
+            try:
+                if self.writer is None or self.writer.is_closing():
+                    self.reader, self.writer = await asyncio.open_unix_connection(str(self.path))
+                self.writer.write(line)
+                # Waits while the display process is not reading, the socket buffer is the only queue
+                await self.writer.drain()
+                reply = await self.reader.readline()
+                if not reply:
+                    raise ConnectionResetError("Display process closed the connection")
+                return json.loads(reply)["status"]
+            except BaseException:
+                # Half a request or reply may be left on the connection
+                self._reset()
+                raise
+
+    async def submit(self, message: QueuedMessage, key: Optional[str] = None) -> str:
+        line = json.dumps(
+            {
+                "text": message.text,
+                "priority": message.priority,
+                "payment": message.payment,
+                "amount_sats": message.amount_sats,
+                "key": key,
+            }
+        )
+        try:
+            return await asyncio.wait_for(self._send(line.encode() + b"\n"), timeout=self.timeout)
+        except (OSError, ValueError, KeyError, asyncio.TimeoutError) as e:
+            raise IngressUnavailable(f"{type(e).__name__}: {e}") from e
+
+    async def close(self):
+        self._reset()
+
+
+class IngressListener:
+    """Receives the messages of the ingress workers on a Unix socket and puts them into the display queue."""
+
+    def __init__(self, sink: QueueSink, path: Optional[Path] = None):
+        self.sink = sink
+        self.path = socket_path() if path is None else path
+        self.server: Optional[asyncio.AbstractServer] = None
+        # Connections of the workers, closed on shutdown so their handlers end
+        self.writers: Set[asyncio.StreamWriter] = set()
+
+    async def start(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            # Left by a previous run that didn't stop cleanly
+            self.path.unlink()
+        self.server = await asyncio.start_unix_server(self._handle, path=str(self.path))
+        # Only this user may inject messages
+        os.chmod(self.path, 0o600)
+        logger.info(f"Listening for the HTTP ingress on {self.path}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    data = json.loads(line)
+                    message = QueuedMessage(
+                        str(data["text"]),
+                        priority=int(data["priority"]),
+                        payment=bool(data["payment"]),
+                        amount_sats=float(data["amount_sats"]),
+                    )
+                    result = self.sink.accept(message, data.get("key"))
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Invalid message from the HTTP ingress: {e}")
+                    result = INVALID
+                writer.write(json.dumps({"status": result}).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            # The worker went away, or the listener is shutting down
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.writers):
+                writer.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.path.exists():
+            self.path.unlink()
+
+
+async def run_ingress_process(host: str, port: int):
+    """serves /message and /lnbits from uvicorn worker processes, restarted if they exit"""
+    command = [
+        sys.executable,
+        "-m",
+        "uvicorn",
+        "--factory",
+        "pixeltracker.ingress:create_worker_app",
+        "--host",
+        host,
+        "--port",
+        str(port),
+        "--workers",
+        str(settings.INGRESS_WORKERS),
+    ]
+    # The workers must find the socket even when the settings were overridden on reload
+    env = dict(os.environ, SUBS_INGRESS_SOCKET=str(socket_path()))
+    while True:
+        process = await asyncio.create_subprocess_exec(*command, env=env)
+        try:
+            code = await process.wait()
+        finally:
+            if process.returncode is None:
+                process.terminate()
+                await process.wait()
+        logger.error(f"HTTP ingress exited with code {code}, restarting it")
+        await asyncio.sleep(1)
+
+
+ingress_router = APIRouter()
+_sink: Optional[MessageSink] = None
+
+
+def set_sink(sink: MessageSink):
+    global _sink
+    _sink = sink
+
+
+def create_worker_app() -> FastAPI:
+    """the app of an ingress worker process, it only forwards the messages to the display process"""
+    set_sink(SocketSink(socket_path()))
+    app = FastAPI()
+    app.include_router(ingress_router)
+    return app
+
+
+async def deliver(message: QueuedMessage, key: Optional[str] = None) -> str:
+    if _sink is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Not started yet")
+    try:
+        result = await _sink.submit(message, key)
+    except IngressUnavailable as e:
+        logger.warning(f"Could not hand the message to the display: {e}")
+        # LNbits retries the webhook later, a repeated delivery is ignored
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Display is busy",
+            headers={"Retry-After": "1"},
+        )
+    if result == INVALID:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid message")
+    return result
+
+
+# Define a route for receiving messages
+@ingress_router.post("/message")
+async def receive_message(message: str):
+    await deliver(QueuedMessage(message))
+    return {"message": "Received"}
+
+
+class WebhookPayload(BaseModel):
+    payment_hash: str
+    payment_request: str
+    amount: float
+    comment: str = None
+    webhook_data: dict = None
+
+    lnurlp: str
+    body: dict = {}
+    headers: dict = {}
+
+
+@ingress_router.post("/lnbits")
+async def handle_lnbits_webhook(request: Request, payload: WebhookPayload):
+    try:
+        # Log the incoming request
+        logger.debug(f"Received webhook: {payload.dict()}")
+
+        # Extract headers from the request
+        headers = request.headers
+
+        # Convert headers to a dictionary
+        headers_dict = {k: v for k, v in headers.items()}
+
+        # Extract product type from header data if present
+        # Try with LNbits Pay Links Webhook headers: {"product": "cookie"}
+        product = headers_dict.get("product", "")
+
+        # Convert millisats to sats
+        amount_in_sats = payload.amount / 1000.0
+
+        # Avoid characters and emojis the font does not support
+        if payload.comment is not None:
+            message = payload.comment
+            description = message.encode("iso-8859-1", "ignore").decode("iso-8859-1")
+        else:
+            description = ""
+
+        if product == "donation":
+            message = " Thank you! %1.0f sats %s! %s" % (amount_in_sats, "received", description)
+        elif len(product) > 0:
+            product = product + " bought. "
+            message = product + "%1.0f sats %s! %s" % (amount_in_sats, "received", description)
+
+        message = message.upper()
+        # LNbits retries until it gets a 2xx, every payment is shown once
+        result = await deliver(
+            QueuedMessage(message, priority=PRIORITY_PAYMENT, payment=True, amount_sats=amount_in_sats),
+            key=payload.payment_hash,
+        )
+
+        # Return a success response
+        if result == DUPLICATE:
+            return {"status": "success", "message": "Webhook already processed"}
+        logger.info(f"Message to display: {message}")
+        return {"status": "success", "message": "Webhook processed"}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing webhook: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
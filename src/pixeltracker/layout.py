@@ -0,0 +1,143 @@
+import logging
+import re
+import string
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from .resource_cache import PIXEL_FONT, PIXEL_FONT_SIZE, resource_cache
+
+logger = logging.getLogger("pixelart-tracker")
+
+SCREEN_WIDTH = 32
+MAX_REPORTED_TEXTS = 256
+
+# Optional prefix, digits, decimals after a point or a comma, optional suffix: $12,34K or 1.08345
+NUMBER = re.compile(r"^(?P<prefix>\D*?)(?P<integer>\d+)(?:(?P<separator>[.,])(?P<decimals>\d+))?(?P<suffix>\D*)$")
+
+
+@dataclass(frozen=True)
+class CharMetrics:
+    advance: int
+    # Horizontal extent of the ink, from the pen position. Equal when the character has no ink.
+    ink_left: int
+    ink_right: int
+
+
+@dataclass(frozen=True)
+class FittedText:
+    text: str
+    width: int
+    # Extra pixels between characters, negative when the text had to be squeezed
+    tracking: int = 0
+    # Pen position of the first character that centers the ink on the screen
+    x: int = 0
+
+
+class FontMetrics:
+    """Width table of a font, measured from the real glyph advances and ink boxes."""
+
+    def __init__(self, font_name: str = PIXEL_FONT, font_size: int = PIXEL_FONT_SIZE):
+        self.font_name = font_name
+        self.font_size = font_size
+        self.chars: Dict[str, CharMetrics] = {}
+        for char in string.printable:
+            if char.isprintable():
+                self.char(char)
+
+    def _measure(self, char: str) -> CharMetrics:
+        font = resource_cache.font(self.font_name, self.font_size)
+        advance = round(font.getlength(char))
+        left, _, right, _ = font.getbbox(char)
+        if right <= left:
+            return CharMetrics(advance, 0, 0)
+        return CharMetrics(advance, left, right)
+
+    def char(self, char: str) -> CharMetrics:
+        metrics = self.chars.get(char)
+        if metrics is None:
+            metrics = self.chars[char] = self._measure(char)
+        return metrics
+
+    def extent(self, text: str, tracking: int = 0) -> Tuple[int, int]:
+        """left and right edges of the ink of a text written from pen position 0"""
+        left, right = None, None
+        pen = 0
+        for char in text:
+            metrics = self.char(char)
+            if metrics.ink_right > metrics.ink_left:
+                left = pen + metrics.ink_left if left is None else left
+                right = pen + metrics.ink_right
+            pen += metrics.advance + tracking
+        if left is None:
+            return 0, 0
+        return left, right
+
+    def width(self, text: str, tracking: int = 0) -> int:
+        left, right = self.extent(text, tracking)
+        return right - left
+
+
+def abbreviations(text: str) -> Iterator[str]:
+    """shorter spellings of a number, dropping one decimal at a time: $12,34K, $12,3K, $12K"""
+    match = NUMBER.match(text)
+    if match is None or not match.group("decimals"):
+        return
+    prefix, integer, separator, decimals, suffix = match.group("prefix", "integer", "separator", "decimals", "suffix")
+    value = Decimal(f"{integer}.{decimals}")
+    for places in range(len(decimals) - 1, -1, -1):
+        rounded = value.quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP)
+        yield prefix + str(rounded).replace(".", separator) + suffix
+
+
+class TextLayout:
+    """Centers texts with exact glyph metrics and makes them fit the screen width."""
+
+    def __init__(self, width: int = SCREEN_WIDTH):
+        self.width = width
+        self.fonts: Dict[Tuple[str, int], FontMetrics] = {}
+        # Texts already reported as truncated, the same label is fitted again on every rotation
+        self.truncated: Set[str] = set()
+
+    def metrics(self, font_name: str = PIXEL_FONT, font_size: int = PIXEL_FONT_SIZE) -> FontMetrics:
+        key = (font_name, font_size)
+        metrics = self.fonts.get(key)
+        if metrics is None:
+            metrics = self.fonts[key] = FontMetrics(font_name, font_size)
+            logger.debug(f"Measured {len(metrics.chars)} characters of {font_name} at size {font_size}")
+        return metrics
+
+    def center_x(self, text: str, tracking: int = 0, metrics: Optional[FontMetrics] = None) -> int:
+        """pen position that centers the ink of a text on the screen"""
+        metrics = metrics or self.metrics()
+        left, right = metrics.extent(text, tracking)
+        return (self.width - (right - left)) // 2 - left
+
+    def fit(self, text: str, max_width: Optional[int] = None, metrics: Optional[FontMetrics] = None) -> FittedText:
+        """abbreviates, then squeezes and as a last resort truncates a text until it fits the screen"""
+        metrics = metrics or self.metrics()
+        max_width = self.width if max_width is None else max_width
+        candidates = [text, *abbreviations(text)]
+        # Fewer decimals before touching characters, touching characters before losing any
+        for tracking in (0, -1):
+            for candidate in candidates:
+                width = metrics.width(candidate, tracking)
+                if width <= max_width:
+                    if candidate != text or tracking:
+                        logger.debug(f"Fitted {text!r} as {candidate!r} with tracking {tracking}")
+                    return FittedText(candidate, width, tracking, self.center_x(candidate, tracking, metrics))
+
+        truncated = candidates[-1]
+        while truncated and metrics.width(truncated, -1) > max_width:
+            truncated = truncated[:-1]
+        if text not in self.truncated:
+            if len(self.truncated) >= MAX_REPORTED_TEXTS:
+                # Prices change, don't keep every text ever shown
+                self.truncated.clear()
+            self.truncated.add(text)
+            logger.warning(f"Text {text!r} does not fit the screen, truncated to {truncated!r}")
+        width = metrics.width(truncated, -1)
+        return FittedText(truncated, width, -1, self.center_x(truncated, -1, metrics))
+
+
+text_layout = TextLayout()
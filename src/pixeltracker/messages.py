@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+# Lower values are shown first
+PRIORITY_PAYMENT = 0
+PRIORITY_MESSAGE = 1
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_MERGE = "merge"
+
+
+def format_sats(amount: float) -> str:
+    if amount < 1000:
+        return f"{amount:1.0f}"
+    if amount < 1000000:
+        return f"{amount / 1000:.1f}".rstrip("0").rstrip(".") + "K"
+    return f"{amount / 1000000:.1f}".rstrip("0").rstrip(".") + "M"
+
+
+@dataclass
+class QueuedMessage:
+    text: str
+    priority: int = PRIORITY_MESSAGE
+    payment: bool = False
+    amount_sats: float = 0
+    count: int = 1
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+    def merge(self, other: "QueuedMessage"):
+        """folds another message of the same kind into this one"""
+        if self.payment:
+            self.count += other.count
+            self.amount_sats += other.amount_sats
+            self.text = f" {self.count} PAYMENTS, {format_sats(self.amount_sats)} SATS RECEIVED!"
+        else:
+            self.count += other.count
+            self.text = f"{self.text} | {other.text}"
+        self.priority = min(self.priority, other.priority)
+
+
+class MessageQueue:
+    """Bounded priority queue of messages to show, bursts of payments are coalesced into one message."""
+
+    def __init__(
+        self,
+        maxsize: int = settings.MESSAGE_QUEUE_MAX_DEPTH,
+        overflow: str = settings.MESSAGE_QUEUE_OVERFLOW,
+        coalesce_window: float = settings.PAYMENT_COALESCE_WINDOW,
+    ):
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.coalesce_window = coalesce_window
+        self.items: List[QueuedMessage] = []
+        self.changed = asyncio.Event()
+
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.merged = 0
+        self.delivered = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def qsize(self) -> int:
+        return len(self.items)
+
+    def empty(self) -> bool:
+        return not self.items
+
+    def _coalesce(self, message: QueuedMessage) -> bool:
+        if not message.payment:
+            return False
+        for item in self.items:
+            if item.payment and message.enqueued_at - item.enqueued_at <= self.coalesce_window:
+                item.merge(message)
+                self.coalesced += 1
+                return True
+        return False
+
+    def _overflow(self, message: QueuedMessage) -> bool:
+        """makes room for a message, returns False when it has been merged or dropped instead"""
+        if self.overflow == OVERFLOW_MERGE:
+            same_kind = [item for item in self.items if item.payment == message.payment]
+            if same_kind:
+                same_kind[-1].merge(message)
+                self.merged += 1
+                return False
+
+        # Drop the oldest of the least important messages
+        lowest = max(item.priority for item in self.items)
+        if message.priority > lowest:
+            # Everything queued is more important, e.g. only payments and a plain message comes in
+            self.dropped += 1
+            logger.warning(f"Message queue full, dropped: {message.text}")
+            return False
+        oldest = next(item for item in self.items if item.priority == lowest)
+        self.items.remove(oldest)
+        self.dropped += 1
+        logger.warning(f"Message queue full, dropped: {oldest.text}")
+        return True
+
+    def put_nowait(self, message: QueuedMessage):
+        self.received += 1
+        if not self._coalesce(message):
+            if len(self.items) >= self.maxsize and not self._overflow(message):
+                self.changed.set()
+                return
+            self.items.append(message)
+            self.max_depth = max(self.max_depth, len(self.items))
+        self.changed.set()
+
+    async def put(self, message: QueuedMessage):
+        self.put_nowait(message)
+
+    def _pop(self, max_priority: Optional[int]) -> Optional[QueuedMessage]:
+        candidates = [item for item in self.items if max_priority is None or item.priority <= max_priority]
+        if not candidates:
+            return None
+        # Most important first, oldest first within the same priority
+        message = min(candidates, key=lambda item: item.priority)
+        self.items.remove(message)
+
+        wait = time.monotonic() - message.enqueued_at
+        self.delivered += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return message
+
+    async def get(self, max_priority: Optional[int] = None) -> QueuedMessage:
+        """waits for the next message, or only for a message at least as important as max_priority"""
+        while True:
+            message = self._pop(max_priority)
+            if message is not None:
+                return message
+            self.changed.clear()
+            await self.changed.wait()
+
+    def task_done(self):
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self.items),
+            "max_depth": self.max_depth,
+            "received": self.received,
+            "delivered": self.delivered,
+            "coalesced": self.coalesced,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "average_wait_seconds": round(self.total_wait / self.delivered, 1) if self.delivered else 0.0,
+            "max_wait_seconds": round(self.max_wait, 1),
+        }
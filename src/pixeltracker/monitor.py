@@ -0,0 +1,49 @@
+import asyncio
+import logging
+
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up, blocking calls on the loop show up as lag."""
+
+    def __init__(self, interval: float = settings.LOOP_LAG_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.warnings = 0
+
+    @property
+    def average_lag(self) -> float:
+        return self.total_lag / self.samples if self.samples else 0.0
+
+    def record(self, lag: float):
+        self.samples += 1
+        self.last_lag = lag
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= settings.LOOP_LAG_WARNING:
+            self.warnings += 1
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+    def stats(self) -> dict:
+        return {
+            "samples": self.samples,
+            "last_lag_ms": self.last_lag * 1000,
+            "average_lag_ms": self.average_lag * 1000,
+            "max_lag_ms": self.max_lag * 1000,
+            "warnings": self.warnings,
+        }
+
+    async def run(self):
+        if self.interval <= 0:
+            return
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(max(loop.time() - start - self.interval, 0.0))
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .display import DisplayScheduler
+from .refresher import RefreshScheduler
+from .resource_cache import resource_cache
+from .screen import IDotMatrixScreen
+from .settings import reload_settings, settings
+from .tiles import IDotMatrixTile
+from .tiles.registry import tile_registry
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+def get_playlists() -> Dict[str, List[str]]:
+    """tiles to show on every device address, as configured in settings.PLAYLISTS"""
+    playlists = {}
+    for entry in str(settings.PLAYLISTS).split(";"):
+        if "=" not in entry:
+            continue
+        address, tiles = entry.split("=", 1)
+        playlists[address.strip().upper()] = tiles.strip().split(",")
+    return playlists
+
+
+@dataclass
+class Device:
+    screen: IDotMatrixScreen
+    address: str
+    scheduler: DisplayScheduler
+
+    @property
+    def tiles(self) -> List[IDotMatrixTile]:
+        return self.scheduler.tiles
+
+
+class Playlist:
+    """Tiles shown by every device, rebuilt in place when the settings are reloaded."""
+
+    def __init__(self, refresher: RefreshScheduler, test: bool = False):
+        self.refresher = refresher
+        self.test = test
+        self.devices: List[Device] = []
+        self._reload_lock = asyncio.Lock()
+
+    def build(self, screen: IDotMatrixScreen, address: str) -> List[IDotMatrixTile]:
+        tile_collection = get_playlists().get(address.upper(), str(settings.TILES).split(","))
+        # Only the modules of the configured tiles are imported
+        return tile_registry.build(screen, tile_collection, self.test)
+
+    @property
+    def tiles(self) -> List[IDotMatrixTile]:
+        return [tile for device in self.devices for tile in device.tiles]
+
+    def add_device(self, device: Device):
+        self.devices.append(device)
+        self._watch(device.tiles)
+
+    def _watch(self, tiles: List[IDotMatrixTile]):
+        # Parse fonts and backgrounds once, before the first render
+        resource_cache.preload(tiles)
+        # Keep the data of every tile warm so the rotation never waits on the network
+        for tile in tiles:
+            for source in tile.data_sources():
+                self.refresher.add(source)
+
+    async def reload(self, overrides: Optional[dict] = None) -> dict:
+        """reloads the settings and only builds or tears down the tiles that changed"""
+        async with self._reload_lock:
+            changed = reload_settings(overrides)
+            if changed:
+                logger.info(f"Settings reloaded, changed: {', '.join(changed)}")
+
+            old_tiles = {tile.key: tile for tile in self.tiles}
+            rotations = []
+            for device in self.devices:
+                current = {tile.key: tile for tile in device.tiles}
+                # Tiles showing the same content are kept, with their data and rendered frames
+                rotations.append([current.get(tile.key, tile) for tile in self.build(device.screen, device.address)])
+
+            new_keys = {tile.key for tiles in rotations for tile in tiles}
+            added = [tile for tiles in rotations for tile in tiles if tile.key not in old_tiles]
+            removed = [tile for key, tile in old_tiles.items() if key not in new_keys]
+
+            for tile in removed:
+                tile.detach()
+            # New tiles may need data their shared provider didn't fetch so far
+            self._watch(added)
+            for tile in added:
+                for source in tile.data_sources():
+                    if not source.has_data:
+                        source.restore_snapshot()
+                    self.refresher.refresh_soon(source)
+
+            for device, tiles in zip(self.devices, rotations):
+                device.scheduler.refresh_time = settings.REFRESH_TIME
+                if [tile.key for tile in tiles] != [tile.key for tile in device.tiles]:
+                    device.scheduler.set_tiles(tiles)
+
+            # Stop refreshing the sources no tile reads from anymore
+            used = {id(source) for tile in self.tiles for source in tile.data_sources()}
+            for source in list(self.refresher.sources):
+                if id(source) not in used:
+                    self.refresher.remove(source)
+                    source.close()
+
+            summary = {
+                "changed": sorted(changed),
+                "added": sorted({tile.key for tile in added}),
+                "removed": sorted(tile.key for tile in removed),
+            }
+            logger.info(f"Playlist reloaded: {summary}")
+            return summary
@@ -0,0 +1,13 @@
+from .crypto import CoinMarket, CryptoProvider, crypto_provider
+from .provider import DataProvider
+from .youtube import YoutubeProvider, youtube_provider
+
+# yfinance and pandas take seconds to import on a Pi Zero, import .finance only when a Finance tile is used
+__all__ = (
+    "DataProvider",
+    "CoinMarket",
+    "CryptoProvider",
+    "crypto_provider",
+    "YoutubeProvider",
+    "youtube_provider",
+)
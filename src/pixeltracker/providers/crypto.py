@@ -0,0 +1,100 @@
+import logging
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, List
+
+from ..ratelimit import rate_limiter
+from ..settings import settings
+from .provider import DataProvider
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+@dataclass
+class CoinMarket:
+    symbol: str
+    price: Decimal
+    price_change_24h: Decimal
+
+
+class CryptoProvider(DataProvider):
+    """Fetches the market data of every registered coin with a single CoinGecko request."""
+
+    cache_key = "crypto"
+
+    def __init__(self):
+        self.coins: List[str] = []
+        self.markets: Dict[str, CoinMarket] = {}
+
+    @property
+    def refresh_interval(self) -> float:
+        # Faster refreshes would only be rejected by the rate limiter and make the data look stale
+        return max(settings.CRYPTO_REFRESH_INTERVAL, rate_limiter.min_interval(str(settings.CRYPTO_API_HOST)))
+
+    def add_coin(self, coin: str):
+        coin = coin.lower()
+        if coin not in self.coins:
+            self.coins.append(coin)
+
+    def remove_coin(self, coin: str):
+        coin = coin.lower()
+        if coin in self.coins:
+            self.coins.remove(coin)
+        self.markets.pop(coin, None)
+
+    def get_url(self) -> str:
+        base_url = settings.CRYPTO_API_HOST
+        ids = ",".join(self.coins)
+        return f"{base_url}/coins/markets?vs_currency=usd&ids={ids}&per_page={len(self.coins)}"
+
+    async def get_data(self):
+        if not self.coins:
+            return
+
+        response = await self.get_json(self.get_url())
+
+        markets = {}
+        for item in response:
+            if not item.get("symbol") or item.get("current_price") is None:
+                continue
+            markets[item["id"]] = CoinMarket(
+                symbol=item["symbol"].lower(),
+                price=Decimal(str(item["current_price"])),
+                price_change_24h=Decimal(str(item.get("price_change_percentage_24h") or 0)),
+            )
+
+        missing = [coin for coin in self.coins if coin not in markets]
+        if missing:
+            logger.warning(f"CoinGecko returned no market data for: {', '.join(missing)}")
+
+        logger.debug(f"Obtained market data for {len(markets)} coins from CoinGecko API")
+        self.markets = markets
+
+    def snapshot(self) -> dict:
+        return {
+            coin: {
+                "symbol": market.symbol,
+                "price": str(market.price),
+                "price_change_24h": str(market.price_change_24h),
+            }
+            for coin, market in self.markets.items()
+        }
+
+    def restore(self, data: dict):
+        self.markets = {
+            coin: CoinMarket(
+                symbol=market["symbol"],
+                price=Decimal(market["price"]),
+                price_change_24h=Decimal(market["price_change_24h"]),
+            )
+            for coin, market in data.items()
+        }
+
+    def get(self, coin: str) -> CoinMarket:
+        try:
+            return self.markets[coin]
+        except KeyError:
+            raise ValueError(f"No market data for {coin}")
+
+
+crypto_provider = CryptoProvider()
@@ -0,0 +1,297 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+import yfinance as yf
+
+from ..metrics import STAGE_SECONDS, UPSTREAM_ERRORS
+from ..settings import settings
+from .provider import DataProvider
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+@dataclass
+class TickerQuote:
+    symbol: str
+    price: Decimal
+    price_change_24h: Decimal
+    # Hourly closes of the last 24 hours, oldest first
+    history: List[float] = field(default_factory=list)
+
+
+class TickerMetadataIndex:
+    """Keeps the static metadata of the tickers on disk, so it is only fetched about once a day."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        try:
+            self.entries = json.loads(self.path.read_text())
+        except FileNotFoundError:
+            self.entries = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable ticker metadata index {self.path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self.entries))
+            tmp_path.replace(self.path)
+        except OSError as e:
+            logger.warning(f"Could not save the ticker metadata index {self.path}: {e}")
+
+    def short_names(self, tickers: List[str]) -> Dict[str, str]:
+        if not self.loaded:
+            self.load()
+
+        now = time.time()
+        stale = [
+            ticker
+            for ticker in tickers
+            if now - self.entries.get(ticker, {}).get("updated", 0) > settings.FINANCE_METADATA_TTL
+        ]
+        for ticker in stale:
+            try:
+                short_name = yf.Ticker(ticker).info["shortName"]
+                self.entries[ticker] = {"short_name": short_name, "updated": now}
+            except Exception as e:
+                logger.warning(f"Could not fetch the metadata of {ticker}: {e}")
+        if stale:
+            self.save()
+
+        return {ticker: self.entries.get(ticker, {}).get("short_name", ticker) for ticker in tickers}
+
+
+class FinanceProvider(DataProvider):
+    """Fetches the quotes of every registered Yahoo Finance ticker in one batch for all Finance tiles."""
+
+    cache_key = "finance"
+
+    def __init__(self):
+        self.tickers: List[str] = []
+        self.quotes: Dict[str, TickerQuote] = {}
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.metadata = TickerMetadataIndex(Path(settings.CACHE_DIR).expanduser() / "finance-metadata.json")
+
+    @property
+    def refresh_interval(self) -> float:
+        return settings.FINANCE_REFRESH_INTERVAL
+
+    def add_ticker(self, ticker: str):
+        if ticker not in self.tickers:
+            self.tickers.append(ticker)
+
+    def remove_ticker(self, ticker: str):
+        if ticker in self.tickers:
+            self.tickers.remove(ticker)
+        self.quotes.pop(ticker, None)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(
+                max_workers=settings.FINANCE_WORKERS,
+                thread_name_prefix="finance",
+            )
+        return self.executor
+
+    async def get_data(self):
+        if not self.tickers:
+            return
+
+        # yfinance and pandas block for seconds, keep them off the event loop
+        tickers = list(self.tickers)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor(), self.fetch_quotes, tickers)
+        try:
+            with STAGE_SECONDS.time(stage="yfinance", source="yahoo-finance"):
+                fetched = await asyncio.wait_for(future, timeout=settings.FINANCE_FETCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            UPSTREAM_ERRORS.inc(upstream="yahoo-finance")
+            logger.error(f"Timed out fetching {len(tickers)} tickers after {settings.FINANCE_FETCH_TIMEOUT} seconds")
+            # A thread can't be cancelled, leave the hung one behind so the next fetches don't queue after it
+            self.close()
+            raise
+        except Exception:
+            UPSTREAM_ERRORS.inc(upstream="yahoo-finance")
+            raise
+
+        quotes = {}
+        for ticker in tickers:
+            if ticker in fetched:
+                quotes[ticker] = fetched[ticker]
+            elif ticker in self.quotes:
+                # Keep serving the last quote of this ticker
+                quotes[ticker] = self.quotes[ticker]
+
+        if not quotes:
+            raise ValueError("No data found for any ticker")
+        self.quotes = quotes
+
+    @staticmethod
+    def _ticker_frame(frame: pd.DataFrame, ticker: str) -> pd.DataFrame:
+        if isinstance(frame.columns, pd.MultiIndex):
+            if ticker not in frame.columns.get_level_values(0):
+                return pd.DataFrame(columns=["Close"], dtype=float)
+            frame = frame[ticker]
+        return frame.dropna(subset=["Close"])
+
+    def fetch_quotes(self, tickers: List[str]) -> Dict[str, TickerQuote]:
+        """downloads every ticker in one hourly and one daily batch"""
+        # Get current UTC time (or use a specific time)
+        current_time = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        time_24h_ago = current_time - timedelta(hours=24)
+
+        # Fetch data using yfinance with 1 hour interval for the last 24 hours
+        data = yf.download(
+            tickers,
+            start=time_24h_ago - timedelta(hours=1),  # Buffer to ensure coverage
+            end=current_time + timedelta(hours=1),
+            interval="1h",
+            group_by="ticker",
+            repair=True,
+            progress=False,
+            threads=False,
+            # Each of the two downloads gets half of the batch timeout, so a hung socket frees the thread
+            timeout=settings.FINANCE_FETCH_TIMEOUT / 2,
+        )
+
+        # Fetch historical data up until the day before today
+        end_date = current_time - timedelta(days=1)
+        start_date = end_date - timedelta(days=4)  # 4 days of data, but up to the day before today
+        hist = yf.download(
+            tickers,
+            start=start_date,
+            end=end_date,
+            interval="1d",
+            group_by="ticker",
+            progress=False,
+            threads=False,
+            timeout=settings.FINANCE_FETCH_TIMEOUT / 2,
+        )
+
+        names = self.metadata.short_names(tickers)
+
+        quotes = {}
+        for ticker in tickers:
+            try:
+                quotes[ticker] = self.compute_quote(
+                    ticker,
+                    names[ticker],
+                    self._ticker_frame(data, ticker),
+                    self._ticker_frame(hist, ticker),
+                    current_time,
+                    time_24h_ago,
+                )
+            except Exception as e:
+                logger.error(f"An error occurred computing {ticker}: {e}")
+        return quotes
+
+    def compute_quote(
+        self,
+        ticker: str,
+        name: str,
+        data: pd.DataFrame,
+        hist: pd.DataFrame,
+        current_time: datetime,
+        time_24h_ago: datetime,
+    ) -> TickerQuote:
+        if hist.empty:
+            raise ValueError(f"No data found for ticker {ticker}")
+
+        # Ensure the index of data is in UTC
+        index = pd.to_datetime(data.index)
+        if index.tz is not None:
+            index = index.tz_convert("UTC")
+        data.index = index.tz_localize(None)
+
+        # Create empty DataFrame with your desired timestamps
+        desired_times = pd.date_range(start=time_24h_ago, end=current_time, freq="h")
+        result = pd.DataFrame(index=desired_times, columns=["Close"], dtype=float)
+
+        # Reindex data to match the desired times and fill in the values
+        data_reindexed = data.reindex(desired_times)
+        result.update(data_reindexed[["Close"]])
+        logger.debug(result)
+
+        # Fill NaN values with the latest available data
+        result = result.ffill()
+
+        # Extract values
+        latest_price = result["Close"].iloc[-1] if not result.empty else None
+        price_24h_ago = result["Close"].iloc[0] if not result.empty else None
+
+        # If data is missing, use the latest close price
+        if pd.isna(latest_price):
+            logger.debug(f"Data was missing for {ticker}, using latest close price")
+            latest_price = hist["Close"].iloc[-1]
+            price_24h_ago = hist["Close"].iloc[-1]
+
+        # If 24h price is missing, use previous daily close
+        if pd.isna(price_24h_ago):
+            price_24h_ago = hist["Close"].iloc[-1]
+
+        # Calculate the 24-hour price change percentage
+        price_24h_change = ((latest_price - price_24h_ago) / price_24h_ago) * 100
+
+        quote = TickerQuote(
+            symbol=name.replace("/", ""),
+            price=Decimal(str(latest_price)),
+            price_change_24h=Decimal(str(price_24h_change)),
+            history=[float(close) for close in result["Close"].dropna()],
+        )
+
+        logger.debug(f"Obtained data for {ticker}")
+        logger.debug(f"Price obtained from Yahoo Finance: {quote.price}")
+        logger.debug(f"24-hour price change: {quote.price_change_24h}%")
+        return quote
+
+    def snapshot(self) -> dict:
+        return {
+            ticker: {
+                "symbol": quote.symbol,
+                "price": str(quote.price),
+                "price_change_24h": str(quote.price_change_24h),
+                "history": quote.history,
+            }
+            for ticker, quote in self.quotes.items()
+        }
+
+    def restore(self, data: dict):
+        self.quotes = {
+            ticker: TickerQuote(
+                symbol=quote["symbol"],
+                price=Decimal(quote["price"]),
+                price_change_24h=Decimal(quote["price_change_24h"]),
+                history=quote.get("history", []),
+            )
+            for ticker, quote in data.items()
+        }
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def get(self, ticker: str) -> TickerQuote:
+        try:
+            return self.quotes[ticker]
+        except KeyError:
+            raise ValueError(f"No data for ticker {ticker}")
+
+
+finance_provider = FinanceProvider()
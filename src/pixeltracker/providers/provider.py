@@ -0,0 +1,13 @@
+import logging
+
+from ..http_client import http_client
+from ..refresher import DataSource
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+class DataProvider(DataSource):
+    """Fetches data shared by several tiles, so every tile instance reads the same snapshot."""
+
+    async def get_json(self, url: str) -> dict:
+        return await http_client.get_json(url)
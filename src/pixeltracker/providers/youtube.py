@@ -0,0 +1,58 @@
+import logging
+from random import randrange
+from typing import Optional
+
+from ..ratelimit import rate_limiter
+from ..settings import settings
+from .provider import DataProvider
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+class YoutubeProvider(DataProvider):
+    """Fetches the subscriber count of the configured channel once for every YouTube tile."""
+
+    subscribers: int = 0
+    test: bool = False
+
+    @property
+    def cache_key(self) -> Optional[str]:
+        # Fake numbers are not worth keeping
+        return None if self.test else "youtube"
+
+    @property
+    def refresh_interval(self) -> float:
+        return max(settings.YOUTUBE_REFRESH_INTERVAL, rate_limiter.min_interval(str(settings.YOUTUBE_API_HOST)))
+
+    def snapshot(self) -> dict:
+        return {"channel_id": settings.YOUTUBE_CHANNEL_ID, "subscribers": self.subscribers}
+
+    def restore(self, data: dict):
+        if data["channel_id"] != settings.YOUTUBE_CHANNEL_ID:
+            raise ValueError("snapshot of a different channel")
+        self.subscribers = int(data["subscribers"])
+
+    async def get_data(self):
+        if self.test:
+            # Fake subscribers numbers on every refresh to show bigger numbers
+            self.subscribers = self.subscribers + randrange(1000)
+            return
+
+        yt_api_url = settings.YOUTUBE_API_HOST
+        channel_id = settings.YOUTUBE_CHANNEL_ID
+        api_key = settings.YOUTUBE_API_KEY
+        url = f"{yt_api_url}&id={channel_id}&key={api_key}"
+        response = await self.get_json(url)
+
+        items = response["items"]
+        if len(items) < 1:
+            raise ValueError("Not enough items")
+
+        subscribers = items[0]["statistics"]["subscriberCount"]
+
+        logger.debug(f"Subscribers obtained from YouTube Data API: {subscribers}")
+
+        self.subscribers = int(subscribers)
+
+
+youtube_provider = YoutubeProvider()
@@ -0,0 +1,167 @@
+import logging
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+SECONDS_PER_DAY = 86400
+
+
+class RateLimited(Exception):
+    """The budget of a host is spent, the request has to be made again later."""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"{host} rate limit, retry in {retry_in:.1f} seconds")
+        self.host = host
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts of up to `capacity` requests."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def delay(self, now: float) -> float:
+        """seconds to wait until a token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class HostLimiter:
+    """Spreads the requests to one host evenly within its per minute and per day budgets."""
+
+    def __init__(self, host: str, per_minute: int, per_day: int):
+        self.host = host
+        self.per_minute = per_minute
+        self.per_day = per_day
+        # A capacity of one request keeps the requests evenly spaced within the minute
+        self.minute_bucket = TokenBucket(per_minute / 60, 1)
+        # Allow to spend an hour worth of the daily budget at once, e.g. after a restart
+        self.day_bucket = TokenBucket(per_day / SECONDS_PER_DAY, per_day / 24)
+        self.blocked_until = 0.0
+
+        self.requests = 0
+        self.throttled = 0
+        self.retry_after_hits = 0
+        self.day = datetime.now(timezone.utc).date()
+        self.used_today = 0
+
+    @property
+    def min_interval(self) -> float:
+        """shortest time between two refreshes that stays within both budgets"""
+        return max(60 / self.per_minute, SECONDS_PER_DAY / self.per_day)
+
+    def acquire(self):
+        """takes a token, raises RateLimited instead of waiting so the caller can reschedule"""
+        now = time.monotonic()
+        wait = max(
+            self.minute_bucket.delay(now),
+            self.day_bucket.delay(now),
+            self.blocked_until - now,
+        )
+        if wait > 0:
+            self.throttled += 1
+            logger.debug(f"{self.host} rate limit reached, retry in {wait:.1f} seconds")
+            raise RateLimited(self.host, wait)
+
+        self.minute_bucket.take()
+        self.day_bucket.take()
+        self.count()
+
+    def count(self):
+        today = datetime.now(timezone.utc).date()
+        if today != self.day:
+            self.day = today
+            self.used_today = 0
+        self.requests += 1
+        self.used_today += 1
+
+    def retry_after(self, seconds: float):
+        """the host asked to wait before sending more requests"""
+        self.retry_after_hits += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        logger.warning(f"{self.host} asked to retry after {seconds:.0f} seconds")
+
+    def report(self) -> dict:
+        return {
+            "requests": self.requests,
+            "used_today": self.used_today,
+            "daily_budget": self.per_day,
+            "minute_budget": self.per_minute,
+            "throttled": self.throttled,
+            "retry_after_hits": self.retry_after_hits,
+        }
+
+
+def parse_retry_after(value: Optional[str]) -> float:
+    """Retry-After holds either an amount of seconds or an HTTP date"""
+    if not value:
+        return settings.RATE_LIMIT_DEFAULT_RETRY_AFTER
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return settings.RATE_LIMIT_DEFAULT_RETRY_AFTER
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RateLimiter:
+    """Token bucket rate limits of every upstream API host."""
+
+    def __init__(self):
+        self.hosts: Dict[str, HostLimiter] = {}
+
+    def budgets(self) -> Dict[str, tuple]:
+        return {
+            urlparse(str(settings.CRYPTO_API_HOST)).hostname: (
+                settings.CRYPTO_REQUESTS_PER_MINUTE,
+                settings.CRYPTO_REQUESTS_PER_DAY,
+            ),
+            urlparse(str(settings.YOUTUBE_API_HOST)).hostname: (
+                settings.YOUTUBE_REQUESTS_PER_MINUTE,
+                settings.YOUTUBE_REQUESTS_PER_DAY,
+            ),
+        }
+
+    def for_url(self, url: str) -> Optional[HostLimiter]:
+        host = urlparse(url).hostname
+        limiter = self.hosts.get(host)
+        if limiter is None:
+            budget = self.budgets().get(host)
+            if budget is None:
+                return None
+            limiter = HostLimiter(host, *budget)
+            self.hosts[host] = limiter
+        return limiter
+
+    def min_interval(self, url: str) -> float:
+        """refresh interval the budget of the host allows, 0 for hosts without limits"""
+        limiter = self.for_url(url)
+        return 0.0 if limiter is None else limiter.min_interval
+
+    def report(self) -> Dict[str, dict]:
+        return {host: limiter.report() for host, limiter in self.hosts.items()}
+
+
+rate_limiter = RateLimiter()
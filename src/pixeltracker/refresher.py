@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+
+from .cache import snapshot_store
+from .ratelimit import RateLimited
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+
+class DataSource:
+    """Something that fetches data from the network and keeps the last snapshot in memory."""
+
+    updated_at: Optional[float] = None
+    # Wall clock time the data was obtained at, survives restarts through the snapshot cache
+    fetched_at: Optional[float] = None
+    # Name of the snapshot of this source in the persistent cache, None to not persist it
+    cache_key: Optional[str] = None
+    _refresh_lock: Optional[asyncio.Lock] = None
+
+    async def get_data(self):
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        """serializes the data obtained by get_data"""
+        raise NotImplementedError
+
+    def restore(self, data: dict):
+        """loads the data serialized by snapshot"""
+        raise NotImplementedError
+
+    @property
+    def refresh_interval(self) -> float:
+        # Read on every refresh, so a reloaded REFRESH_TIME applies to the sources already created
+        return settings.REFRESH_TIME
+
+    @property
+    def has_data(self) -> bool:
+        return self.updated_at is not None
+
+    @property
+    def stale(self) -> bool:
+        """the data has not been refreshed for a while, e.g. because the upstream API is down"""
+        if self.fetched_at is None:
+            return False
+        return time.time() - self.fetched_at > 2 * self.refresh_interval
+
+    def _fetched(self):
+        self.updated_at = time.monotonic()
+        self.fetched_at = time.time()
+        if self.cache_key:
+            snapshot_store.save(self.cache_key, self.snapshot(), self.fetched_at)
+
+    def restore_snapshot(self) -> bool:
+        """loads the last good snapshot saved by a previous run"""
+        if not self.cache_key:
+            return False
+        try:
+            cached = snapshot_store.load(self.cache_key)
+            if cached is None:
+                return False
+            data, fetched_at = cached
+            self.restore(data)
+        except Exception as e:
+            logger.warning(f"Ignoring cached snapshot {self.cache_key}: {e}")
+            return False
+
+        self.updated_at = time.monotonic()
+        self.fetched_at = fetched_at
+        logger.info(f"Restored {self.cache_key} snapshot from {time.time() - fetched_at:.0f} seconds ago")
+        return True
+
+    def _lock(self) -> asyncio.Lock:
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        return self._refresh_lock
+
+    async def refresh(self):
+        """fetches fresh data and records when it was obtained"""
+        async with self._lock():
+            await self.get_data()
+            self._fetched()
+
+    def close(self):
+        """releases the resources held to fetch the data"""
+
+    async def ensure_data(self):
+        """only goes to the network when no snapshot has ever been obtained"""
+        if self.has_data:
+            return
+        async with self._lock():
+            # A background refresh may have finished while waiting for the lock
+            if self.has_data:
+                return
+            await self.get_data()
+            self._fetched()
+
+
+class RefreshScheduler:
+    """Keeps every data source warm by refreshing it in the background on its own interval."""
+
+    def __init__(self, sources: Iterable[DataSource] = ()):
+        self.sources: List[DataSource] = []
+        self.next_refresh = {}
+        # Every source refreshes in its own task, a slow or throttled one doesn't hold back the others
+        self.refreshing: Dict[int, asyncio.Task] = {}
+        # Set when a source has to be refreshed before the next planned refresh
+        self.wake = asyncio.Event()
+        for source in sources:
+            self.add(source)
+
+    def add(self, source: DataSource):
+        # Several tiles may share the same source, refresh it only once
+        if any(source is known for known in self.sources):
+            return
+        self.sources.append(source)
+        self.next_refresh[id(source)] = 0.0
+        self.wake.set()
+
+    def refresh_soon(self, source: DataSource):
+        """refreshes a source right away, e.g. when it has to fetch more data than before"""
+        if id(source) in self.next_refresh:
+            self.next_refresh[id(source)] = 0.0
+            self.wake.set()
+
+    def remove(self, source: DataSource):
+        self.sources = [known for known in self.sources if known is not source]
+        self.next_refresh.pop(id(source), None)
+        task = self.refreshing.pop(id(source), None)
+        if task is not None:
+            task.cancel()
+
+    async def _refresh(self, source: DataSource):
+        next_refresh = source.refresh_interval
+        try:
+            await source.refresh()
+        except asyncio.CancelledError:
+            raise
+        except RateLimited as e:
+            # Try again as soon as the budget allows it
+            next_refresh = e.retry_in
+            logger.debug(f"Postponing the refresh of {source.__class__.__name__}: {e}")
+        except Exception as e:
+            logger.error(f"Error refreshing {source.__class__.__name__}: {e}")
+        finally:
+            # Unless removed meanwhile, or asked by refresh_soon to go again
+            if self.next_refresh.get(id(source)) == float("inf"):
+                self.next_refresh[id(source)] = time.monotonic() + next_refresh
+
+    def _start(self, source: DataSource):
+        # Not due again until this refresh is over
+        self.next_refresh[id(source)] = float("inf")
+        task = asyncio.create_task(self._refresh(source))
+        self.refreshing[id(source)] = task
+
+        def done(_):
+            if self.refreshing.get(id(source)) is task:
+                del self.refreshing[id(source)]
+            self.wake.set()
+
+        task.add_done_callback(done)
+
+    def restore(self):
+        """serves the snapshots of the previous run until the first refresh"""
+        for source in self.sources:
+            source.restore_snapshot()
+
+    def close(self):
+        for task in self.refreshing.values():
+            task.cancel()
+        self.refreshing.clear()
+        for source in self.sources:
+            source.close()
+
+    async def refresh_all(self):
+        for source in self.sources:
+            self.next_refresh[id(source)] = float("inf")
+        await asyncio.gather(*(self._refresh(source) for source in self.sources))
+
+    async def run(self):
+        while True:
+            self.wake.clear()
+            now = time.monotonic()
+            due = [
+                source
+                for source in self.sources
+                if self.next_refresh[id(source)] <= now and id(source) not in self.refreshing
+            ]
+            if due:
+                logger.debug(f"Refreshing {len(due)} data sources")
+                for source in due:
+                    self._start(source)
+
+            # Woken up early by a finished refresh, a new source or refresh_soon
+            planned = [at for key, at in self.next_refresh.items() if key not in self.refreshing]
+            delay = min(planned) - time.monotonic() if planned else None
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=None if delay is None else max(delay, 0.1))
+            except asyncio.TimeoutError:
+                pass
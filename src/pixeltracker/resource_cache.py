@@ -0,0 +1,65 @@
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+from PIL import Image, ImageFont
+
+logger = logging.getLogger("pixelart-tracker")
+
+RESOURCES_PATH = Path(__file__).parent.resolve() / "resources"
+PIXEL_FONT = "retro-pixel-petty-5h.ttf"
+PIXEL_FONT_SIZE = 5
+
+
+class ResourceCache:
+    """Loads every font size and background image only once per process."""
+
+    def __init__(self):
+        self.fonts: Dict[Tuple[str, int], ImageFont.FreeTypeFont] = {}
+        self.backgrounds: Dict[str, Image.Image] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, name: str = PIXEL_FONT, size: int = PIXEL_FONT_SIZE) -> ImageFont.FreeTypeFont:
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            self.misses += 1
+            font = ImageFont.truetype(str(RESOURCES_PATH / name), size=size)
+            self.fonts[key] = font
+            logger.debug(f"Loaded font {name} at size {size}")
+        else:
+            self.hits += 1
+        return font
+
+    def _background(self, name: str) -> Image.Image:
+        image = self.backgrounds.get(name)
+        if image is None:
+            self.misses += 1
+            image = Image.open(RESOURCES_PATH / name)
+            image.load()
+            self.backgrounds[name] = image
+            logger.debug(f"Loaded background {name}")
+        else:
+            self.hits += 1
+        return image
+
+    def background(self, name: str) -> Image.Image:
+        """returns a copy of the cached background that is safe to draw on"""
+        return self._background(name).copy()
+
+    def preload(self, tiles: Iterable):
+        for tile in tiles:
+            tile.load_resources()
+        logger.info(f"Preloaded {len(self.fonts)} fonts and {len(self.backgrounds)} backgrounds")
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "fonts": len(self.fonts),
+            "backgrounds": len(self.backgrounds),
+        }
+
+
+resource_cache = ResourceCache()
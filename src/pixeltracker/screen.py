@@ -1,9 +1,64 @@
+import hashlib
+import io
 import logging
+import os
+import tempfile
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Union
+
+from bleak import BleakClient
+from PIL import Image as PILImage
 
 # idotmatrix imports
-from idotmatrix import ConnectionManager, Image, Text, Clock, System
+from idotmatrix import ConnectionManager, Gif, Image, Text, Clock, System
+
+from .connection import BLE_ERRORS, ConnectionSupervisor
+from .metrics import BLE_BYTES_SENT, FRAMES, STAGE_SECONDS
+from .settings import settings
+from .transport import ChunkedWriter
+
+SCREEN_SIZE = 32
+
+# idotmatrix renders every character of a text as a 16x32 bitmap after this separator,
+# one bit per pixel, two bytes per row and the leftmost column in the lowest bit
+TEXT_CHAR_SEPARATOR = b"\x05\xff\xff\xff"
+TEXT_CHAR_WIDTH = 16
+TEXT_CHAR_HEIGHT = 32
+
+
+def text_width(bitmaps: bytes) -> int:
+    """width in pixels of a text rendered by idotmatrix, up to its last lit column"""
+    row_size = TEXT_CHAR_WIDTH // 8
+    step = len(TEXT_CHAR_SEPARATOR) + row_size * TEXT_CHAR_HEIGHT
+    width = 0
+    for index, start in enumerate(range(0, len(bitmaps), step)):
+        bitmap = bitmaps[start + len(TEXT_CHAR_SEPARATOR) : start + step]
+        # Columns lit in any row of the character
+        columns = 0
+        for row in range(0, len(bitmap), row_size):
+            columns |= int.from_bytes(bitmap[row : row + row_size], "little")
+        if columns:
+            width = index * TEXT_CHAR_WIDTH + columns.bit_length()
+    return width
+
+
+def new_connection() -> ConnectionManager:
+    """creates a connection manager that is not shared with the other screens"""
+    # ConnectionManager is a singleton, bypass it to drive several devices from one process
+    conn = ConnectionManager.__new__(ConnectionManager)
+    conn.__init__()
+    return conn
+
+
+@dataclass
+class FrameStats:
+    uploaded: int = 0
+    skipped: int = 0
+    bytes_uploaded: int = 0
+    bytes_saved: int = 0
+    unchanged_slots: int = 0
+
 
 class IDotMatrixScreen:
     conn = ConnectionManager()
@@ -12,11 +67,52 @@ class IDotMatrixScreen:
     image: Optional[Image] = None
     text: Optional[Text] = None
     clock: Optional[Clock] = None    
-    
+    supervisor: Optional[ConnectionSupervisor] = None
+
+    def __init__(self, conn: Optional[ConnectionManager] = None):
+        if conn is not None:
+            self.conn = conn
+        self.writer = ChunkedWriter(self.conn)
+        # Hash and payload size of the frame currently shown on the device
+        self.frame_hash: Optional[str] = None
+        self.frame_size = 0
+        # Last uploaded frame hash of every tile slot
+        self.slot_frames: Dict[str, str] = {}
+        self.frame_stats = FrameStats()
+
+    def _bind(self, module):
+        """makes an idotmatrix module talk to the device of this screen"""
+        module.conn = self.conn
+        return module
+
+    @staticmethod
+    def hash_frame(frame: Union[PILImage.Image, bytes]) -> str:
+        if isinstance(frame, (bytes, bytearray)):
+            pixels = bytes(frame)
+        else:
+            pixels = f"{frame.mode}{frame.size}".encode() + frame.tobytes()
+        return hashlib.blake2b(pixels, digest_size=16).hexdigest()
+
+    def forget_frame(self):
+        """the device no longer shows the last uploaded frame"""
+        self.frame_hash = None
+        self.frame_size = 0
+
+    def forget_device_state(self):
+        """the device has to be put back in image or text mode before the next upload"""
+        self.image = None
+        self.text = None
+        self.clock = None
+        self.forget_frame()
+
     async def scan(self):
         await self.conn.scan()
         quit()
 
+    async def discover(self) -> List[str]:
+        """returns the addresses of all the devices in range"""
+        return list(await self.conn.scan())
+
     async def connect(self, address: str):
         self.logging.info("initializing command line")
         if address:
@@ -24,25 +120,184 @@ class IDotMatrixScreen:
         if address is None:
             self.logging.error("no device address given")
             quit()
-        elif str(address).lower() == "auto":
-            await self.conn.connectBySearch()
-        else:
-            await self.conn.connectByAddress(address)
+        if str(address).lower() == "auto":
+            found = await self.discover()
+            if not found:
+                self.logging.error("no devices found")
+                quit()
+            address = found[0]
+        self.supervisor = ConnectionSupervisor(self, address)
+        await self.connect_device(address, self.supervisor.on_disconnect)
+
+    async def connect_device(self, address: str, on_disconnect: Optional[Callable[[BleakClient], None]] = None):
+        # idotmatrix creates its client without a disconnected callback, give it one that reports the dropped link
+        client = BleakClient(address, disconnected_callback=on_disconnect)
+        await client.connect()
+        self.conn.address = address
+        self.conn.client = client
+
+    async def _upload(self, upload: Callable[[], Awaitable[None]]):
+        """runs an upload, or keeps it as the latest pending one while the link is down"""
+        if self.supervisor is None:
+            await upload()
+            return
+
+        if not self.supervisor.connected.is_set() or not self.supervisor.is_connected():
+            self.supervisor.link_lost()
+            self.supervisor.defer(upload)
+            return
+        try:
+            await upload()
+        except BLE_ERRORS as e:
+            self.supervisor.link_lost(e)
+            self.supervisor.defer(upload)
 
     async def reset(self):
         self.logging.info("resetting device")
-        system = System()
+        self.forget_frame()
+        system = self._bind(System())
         await system.deleteDeviceData()
 
-    async def set_image(self, image_path: Path, process_image: bool):
-        """enables or disables the image mode and uploads a given image file"""
-        self.logging.info("setting image")
+    async def _image_mode(self):
         if not self.image:
-            self.image = Image()
+            self.image = self._bind(Image())
             await self.image.setMode(
                 mode=1,
             )
 
+    @staticmethod
+    def encode_frame(frame: Union[PILImage.Image, bytes]) -> bytes:
+        """encodes a rendered frame, or raw 32x32 RGB bytes, as PNG in memory"""
+        if isinstance(frame, (bytes, bytearray)):
+            frame = PILImage.frombytes("RGB", (SCREEN_SIZE, SCREEN_SIZE), bytes(frame))
+        buffer = io.BytesIO()
+        frame.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    async def set_frame(
+        self,
+        frame: Union[PILImage.Image, bytes],
+        slot: Optional[str] = None,
+        upload: Optional[Callable[[Union[PILImage.Image, bytes], str], Awaitable[None]]] = None,
+    ):
+        """uploads a rendered frame straight from memory, unless the device already shows it"""
+        upload = upload or self._upload_frame
+        frame_hash = self.hash_frame(frame)
+        stats = self.frame_stats
+
+        if slot is not None:
+            if self.slot_frames.get(slot) == frame_hash:
+                stats.unchanged_slots += 1
+            self.slot_frames[slot] = frame_hash
+
+        if frame_hash == self.frame_hash:
+            FRAMES.inc(result="skipped")
+            stats.skipped += 1
+            stats.bytes_saved += self.frame_size
+            self.logging.debug(
+                f"Frame unchanged, skipping upload ({stats.skipped} skipped, {stats.bytes_saved} bytes saved)"
+            )
+            return
+
+        await self._upload(lambda: upload(frame, frame_hash))
+
+    async def _upload_frame(self, frame: Union[PILImage.Image, bytes], frame_hash: str):
+        stats = self.frame_stats
+        self.logging.info("setting frame")
+        with STAGE_SECONDS.time(stage="upload", source="image"):
+            await self._image_mode()
+
+            png_data = self.encode_frame(frame)
+            create_payloads = getattr(self.image, "_createPayloads", None)
+            if create_payloads is None:
+                # This idotmatrix version can only upload from a file
+                await self._upload_png_file(png_data)
+                sent = len(png_data)
+            else:
+                data = create_payloads(png_data)
+                await self.image.conn.connect()
+                await self.image.conn.send(data=data)
+                sent = len(data)
+
+        self.frame_hash = frame_hash
+        self.frame_size = len(png_data)
+        stats.uploaded += 1
+        stats.bytes_uploaded += len(png_data)
+        FRAMES.inc(result="uploaded")
+        BLE_BYTES_SENT.inc(sent, kind="image")
+        self.logging.debug(f"Frame uploaded ({stats.uploaded} uploaded, {stats.bytes_uploaded} bytes sent)")
+
+    async def _upload_png_file(self, png_data: bytes):
+        with tempfile.NamedTemporaryFile(mode="wb", suffix=".png", delete=False) as tmp_image:
+            tmp_image.write(png_data)
+        try:
+            await self.image.uploadUnprocessed(file_path=tmp_image.name)
+        finally:
+            os.unlink(tmp_image.name)
+
+    @staticmethod
+    def encode_animation(frames: Sequence[PILImage.Image], durations: Sequence[int]) -> bytes:
+        """encodes a sequence of frames as a looping GIF in memory, durations are in milliseconds"""
+        buffer = io.BytesIO()
+        frames[0].save(
+            buffer,
+            format="GIF",
+            save_all=True,
+            append_images=list(frames[1:]),
+            duration=list(durations),
+            loop=0,
+            disposal=2,
+        )
+        return buffer.getvalue()
+
+    async def set_animation(
+        self, frames: Sequence[PILImage.Image], durations: Sequence[int], slot: Optional[str] = None
+    ):
+        """uploads a whole animation at once, the device plays it without any more Bluetooth traffic"""
+        gif_data = self.encode_animation(frames, durations)
+        # Same bookkeeping as a single frame, an unchanged animation is not uploaded again
+        await self.set_frame(gif_data, slot=slot, upload=self._upload_animation)
+
+    async def _upload_animation(self, gif_data: bytes, frame_hash: str):
+        stats = self.frame_stats
+        self.logging.info("setting animation")
+        # The device leaves the image mode to play the GIF, enable it again for the next frame
+        self.image = None
+        with STAGE_SECONDS.time(stage="upload", source="gif"):
+            gif = self._bind(Gif())
+            create_payloads = getattr(gif, "_createPayloads", None)
+            if create_payloads is None:
+                await self._upload_gif_file(gif, gif_data)
+                sent = len(gif_data)
+            else:
+                data = create_payloads(gif_data)
+                await gif.conn.connect()
+                await gif.conn.send(data=data)
+                sent = len(data)
+
+        self.frame_hash = frame_hash
+        self.frame_size = len(gif_data)
+        stats.uploaded += 1
+        stats.bytes_uploaded += len(gif_data)
+        FRAMES.inc(result="uploaded")
+        BLE_BYTES_SENT.inc(sent, kind="gif")
+        self.logging.debug(f"Animation uploaded ({len(gif_data)} bytes)")
+
+    @staticmethod
+    async def _upload_gif_file(gif: Gif, gif_data: bytes):
+        with tempfile.NamedTemporaryFile(mode="wb", suffix=".gif", delete=False) as tmp_gif:
+            tmp_gif.write(gif_data)
+        try:
+            await gif.uploadUnprocessed(file_path=tmp_gif.name)
+        finally:
+            os.unlink(tmp_gif.name)
+
+    async def set_image(self, image_path: Path, process_image: bool):
+        """enables or disables the image mode and uploads a given image file"""
+        self.logging.info("setting image")
+        await self._image_mode()
+        self.forget_frame()
+
         if image_path:
             if process_image:
                 await self.image.uploadProcessed(
@@ -57,26 +312,36 @@ class IDotMatrixScreen:
     async def set_clock(self):
         """shows a specific clock"""
         self.logging.info("setting clock") 
+        self.forget_frame()
         if not self.clock:
-            self.clock = Clock()
+            self.clock = self._bind(Clock())
         
         await self.clock.setMode(
             style=1
         )
             
-    async def set_text(self, text, font_path):
-        """shows a specific text"""
+    async def set_text(self, text, font_path) -> int:
+        """shows a specific text, returns its width in pixels once rendered by the device"""
+        if not self.text:
+            self.text = self._bind(Text())
+
+        # Same bitmaps and packet as idotmatrix Text.setMode, but sent in acknowledged chunks
+        bitmaps = self.text._StringToBitmaps(text=text, font_size=16, font_path=font_path)
+        data = self.text._buildStringPacket(
+            text_bitmaps=bitmaps,
+            speed=settings.TEXT_SPEED,
+            text_color_mode=2,
+        )
+        width = text_width(bitmaps)
+        await self._upload(lambda: self._upload_text(data))
+        return width
+
+    async def _upload_text(self, data: bytes):
         self.logging.info("setting text")
         self.clock = None # If I don't zero these out the screen stops reacting to inputs
         self.image = None
+        self.forget_frame()
 
-        if not self.text:
-            self.text = Text()
-
-        await self.text.setMode(
-            text,
-            font_size=16,
-            speed=100,
-            text_color_mode=2, 
-            font_path=font_path
-        )
+        with STAGE_SECONDS.time(stage="upload", source="text"):
+            sent = await self.writer.write(data)
+        BLE_BYTES_SENT.inc(sent, kind="text")
@@ -1,4 +1,5 @@
 import logging
+from typing import Any, Dict, Optional, Tuple
 
 from pydantic import BaseSettings, Field, HttpUrl
 
@@ -17,6 +18,19 @@ class Settings(BaseSettings):
         default="",
         description="Youtube Data API Key to use on requests.",
     )
+    YOUTUBE_REQUESTS_PER_MINUTE = Field(
+        default=10,
+        description="Maximum amount of requests per minute to the YouTube Data API.",
+    )
+    YOUTUBE_REQUESTS_PER_DAY = Field(
+        default=5000,
+        description="Maximum amount of requests per day to the YouTube Data API, half of the free quota.",
+    )
+    YOUTUBE_REFRESH_INTERVAL = Field(
+        default=300,
+        description="Time in seconds between background refreshes of the YouTube statistics, raised to what "
+        "YOUTUBE_REQUESTS_PER_DAY allows.",
+    )
 
     # Crypto settings
     CRYPTO_API_HOST: HttpUrl = Field(
@@ -27,19 +41,184 @@ class Settings(BaseSettings):
         default="bitcoin,ethereum",
         description="Cryptocurrencies symbols split by commas.",
     )
+    CRYPTO_REQUESTS_PER_MINUTE = Field(
+        default=10,
+        description="Maximum amount of requests per minute to the CoinGecko API.",
+    )
+    CRYPTO_REQUESTS_PER_DAY = Field(
+        default=300,
+        description="Maximum amount of requests per day to the CoinGecko API.",
+    )
+    CRYPTO_REFRESH_INTERVAL = Field(
+        default=300,
+        description="Time in seconds between background refreshes of the cryptocurrencies prices, raised to what "
+        "CRYPTO_REQUESTS_PER_DAY allows.",
+    )
     FINANCE_TICKERS = Field(
         default="GC=F,EURUSD=X",
         description="Yahoo Finance tickers split by commas.", 
     )
+    FINANCE_REFRESH_INTERVAL = Field(
+        default=300,
+        description="Time in seconds between background refreshes of the Yahoo Finance tickers.",
+    )
+    FINANCE_METADATA_TTL = Field(
+        default=86400,
+        description="Time in seconds before the cached names of the Yahoo Finance tickers are fetched again.",
+    )
+    FINANCE_WORKERS = Field(
+        default=1,
+        description="Amount of threads fetching Yahoo Finance data off the event loop.",
+    )
+    FINANCE_FETCH_TIMEOUT = Field(
+        default=60.0,
+        description="Timeout in seconds to fetch the data of all the Yahoo Finance tickers.",
+    )
+    FINANCE_CHART = Field(
+        default="none",
+        description="Chart of the last 24 hours under the price of the Finance tiles: none, sparkline or animated. "
+        "The animated chart is uploaded as a 12 frames GIF of about 5.8 KB on every slot, about 10 times the BLE "
+        "traffic of the static sparkline PNG.",
+    )
+    # HTTP client settings
+    HTTP_CONNECT_TIMEOUT = Field(
+        default=10.0,
+        description="Timeout in seconds to establish a connection to an upstream API.",
+    )
+    HTTP_READ_TIMEOUT = Field(
+        default=20.0,
+        description="Timeout in seconds waiting for data from an upstream API.",
+    )
+    HTTP_POOL_SIZE = Field(
+        default=8,
+        description="Maximum amount of simultaneous HTTP connections.",
+    )
+    HTTP_POOL_SIZE_PER_HOST = Field(
+        default=2,
+        description="Maximum amount of simultaneous HTTP connections to the same host.",
+    )
+    HTTP_KEEPALIVE_TIMEOUT = Field(
+        default=120.0,
+        description="Time in seconds to keep an idle HTTP connection open for reuse.",
+    )
+    HTTP_DNS_CACHE_TTL = Field(
+        default=600,
+        description="Time in seconds to cache DNS resolutions.",
+    )
+    RATE_LIMIT_DEFAULT_RETRY_AFTER = Field(
+        default=60.0,
+        description="Time in seconds to wait when an API is rate limiting without a valid Retry-After header.",
+    )
+    # Message queue settings
+    MESSAGE_QUEUE_MAX_DEPTH = Field(
+        default=20,
+        description="Maximum amount of messages waiting to be shown.",
+    )
+    MESSAGE_QUEUE_OVERFLOW = Field(
+        default="drop_oldest",
+        description="What to do with a message when the queue is full: drop_oldest or merge.",
+    )
+    PAYMENT_COALESCE_WINDOW = Field(
+        default=60.0,
+        description="Time in seconds in which payments waiting to be shown are combined into one message.",
+    )
+    PAYMENT_DEDUPE_TTL = Field(
+        default=86400,
+        description="Time in seconds a payment_hash is remembered, to ignore the repeated LNbits webhooks of a payment.",
+    )
+    PAYMENT_DEDUPE_MAX_ENTRIES = Field(
+        default=10000,
+        description="Maximum amount of payment_hash values remembered, the oldest ones are forgotten first.",
+    )
+    PAYMENT_DEDUPE_PERSIST = Field(
+        default=False,
+        description="Persist the remembered payment_hash values in CACHE_DIR, to ignore repeated webhooks after a restart.",
+    )
+    MESSAGE_MAX_CHARS = Field(
+        default=900,
+        description="Maximum amount of characters of a message, the device can't take texts longer than about 960.",
+    )
+    TEXT_SPEED = Field(
+        default=100,
+        description="Scrolling speed of the messages on the device, from 1 to 100.",
+    )
+    TEXT_PIXELS_PER_SECOND = Field(
+        default=60.2,
+        description="Pixels per second a message scrolls at with TEXT_SPEED 100, measured by timing a text on the "
+        "device. Slower speeds are assumed to scroll proportionally slower.",
+    )
+    # Bluetooth connection settings
+    BLE_RECONNECT_MIN_DELAY = Field(
+        default=1.0,
+        description="Initial time in seconds to wait before retrying a lost Bluetooth connection.",
+    )
+    BLE_RECONNECT_MAX_DELAY = Field(
+        default=60.0,
+        description="Maximum time in seconds to wait between Bluetooth reconnection attempts.",
+    )
+    BLE_WRITE_TIMEOUT = Field(
+        default=5.0,
+        description="Time in seconds to wait for the device to acknowledge a chunk of data.",
+    )
+    BLE_CHUNK_DELAY = Field(
+        default=0.01,
+        description="Time in seconds to wait between two chunks of data sent to the device.",
+    )
     # General settings
     TILES = Field(
         default="crypto,finance",
         description="Amount of tiles to show in loop.",
     )
+    PLAYLISTS = Field(
+        default="",
+        description="Tiles of each device as ADDRESS=tile,tile split by semicolons. Devices not listed show TILES.",
+    )
     REFRESH_TIME = Field(
         default=30,
         description="Refresh time amount in seconds to refresh the screen image with the next tile.",
     )
+    ADMIN_TOKEN = Field(
+        default="",
+        description="Token required in the X-Admin-Token header of the admin endpoints, empty to disable them.",
+    )
+    INGRESS_MODE = Field(
+        default="inline",
+        description="Where /message and /lnbits are served: inline on the display event loop, or process to use "
+        "separate uvicorn workers that hand the messages over a Unix socket.",
+    )
+    INGRESS_WORKERS = Field(
+        default=1,
+        description="Amount of uvicorn worker processes serving /message and /lnbits in the process mode.",
+    )
+    INGRESS_SOCKET = Field(
+        default="",
+        description="Unix socket the ingress workers send the messages to, empty for ingress.sock in CACHE_DIR.",
+    )
+    INGRESS_TIMEOUT = Field(
+        default=2.0,
+        description="Time in seconds an ingress worker waits for the display process before answering 503.",
+    )
+    INGRESS_ADMIN_PORT = Field(
+        default=9192,
+        description="Port of the display process for /metrics, /queue and /admin/reload in the process mode.",
+    )
+    CACHE_DIR = Field(
+        default="~/.cache/pixelart-tracker",
+        description="Directory where data is persisted between restarts.",
+    )
+    CACHE_FLUSH_INTERVAL = Field(
+        default=600,
+        description="Time in seconds between writes of the cached data to disk.",
+    )
+    LOOP_LAG_INTERVAL = Field(
+        default=0,
+        description="Time in seconds between event loop responsiveness probes, 0 to disable them. They wake the "
+        "process up, only enable them to investigate lag.",
+    )
+    LOOP_LAG_WARNING = Field(
+        default=0.25,
+        description="Event loop lag in seconds that is logged as a warning.",
+    )
     LOG_LEVEL = Field(
         default=logging.INFO,
         description="Default log level for different packages",
@@ -52,3 +231,35 @@ class Settings(BaseSettings):
 
 
 settings = Settings()
+
+# Settings the admin endpoint may override, never the API hosts, the keys nor the admin token
+RELOADABLE_SETTINGS = frozenset(
+    {
+        "TILES",
+        "PLAYLISTS",
+        "REFRESH_TIME",
+        "YOUTUBE_CHANNEL_ID",
+        "YOUTUBE_REFRESH_INTERVAL",
+        "CRYPTO_CURRENCIES",
+        "CRYPTO_REFRESH_INTERVAL",
+        "FINANCE_TICKERS",
+        "FINANCE_REFRESH_INTERVAL",
+        "FINANCE_CHART",
+        "MESSAGE_MAX_CHARS",
+    }
+)
+
+
+def reload_settings(overrides: Optional[dict] = None) -> Dict[str, Tuple[Any, Any]]:
+    """reads the environment and the .env file again and updates the settings in place, returns what changed"""
+    forbidden = sorted(set(overrides or {}) - RELOADABLE_SETTINGS)
+    if forbidden:
+        raise ValueError(f"Settings that can't be overridden: {', '.join(forbidden)}")
+    new_settings = Settings(**(overrides or {}))
+    changed = {}
+    for name in Settings.__fields__:
+        old, new = getattr(settings, name), getattr(new_settings, name)
+        if old != new:
+            changed[name] = (old, new)
+            setattr(settings, name, new)
+    return changed
@@ -1,7 +1,7 @@
 from .crypto import Crypto
-from .tile import IDotMatrixTile
+from .tile import IDotMatrixTile, RenderedTile
 from .yt_viewers import YoutubeViewers
 from .message import Message
-from .finance import Finance
 
-__all__ = ("YoutubeViewers", "Crypto", "IDotMatrixTile", "Message", "Finance")
+# Finance pulls pandas and yfinance, it is imported from .finance by the tile registry when configured
+__all__ = ("YoutubeViewers", "Crypto", "IDotMatrixTile", "RenderedTile", "Message")
@@ -1,15 +1,13 @@
 import logging
-import os
-import tempfile
 from decimal import Decimal
-from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
-from PIL import Image, ImageDraw, ImageFont
+from ..compositor import Layout, TextLine, trend_color
+from ..providers import crypto_provider
 from ..screen import IDotMatrixScreen
 from ..settings import settings
 
-from .tile import IDotMatrixTile
+from .tile import IDotMatrixTile, RenderedTile
 
 logger = logging.getLogger("pixelart-tracker")
 
@@ -23,62 +21,45 @@ class Crypto(IDotMatrixTile):
     def __init__(self, idms: IDotMatrixScreen, crypto: str, test: bool):
         super().__init__(idms, test)
         self.crypto = crypto.lower()
+        self.provider = crypto_provider
+        self.provider.add_coin(self.crypto)
 
-    async def get_data(self):
-        base_url = settings.CRYPTO_API_HOST
-        url = f"{base_url}/coins/{self.crypto}"
-        response = await self.get_json(url)
-
-        crypto_name = response["name"]
-        logger.debug(f"Obtained data for {crypto_name}")
-
-        price = response["market_data"]["current_price"]["usd"]
-        price_24h_change = response["market_data"]["price_change_percentage_24h"]
-
-        item = response["symbol"]
-        if not item:
-            raise ValueError("Not enough items")
-
-        logger.debug(f"Price obtained from CoinGecko API: {price}")
+    @classmethod
+    def from_settings(cls, idms: IDotMatrixScreen, test: bool) -> List["Crypto"]:
+        return [cls(idms, crypto, test) for crypto in str(settings.CRYPTO_CURRENCIES).split(",")]
 
-        self.symbol = item.lower()
-        self.price = Decimal(str(price))
-        self.price_change_24h = Decimal(str(price_24h_change))
+    def detach(self):
+        self.provider.remove_coin(self.crypto)
 
-    def create_image(self, text: str, image_path: Path):
-        current = Path(__file__).parent.resolve()
-        background_path = current / f"../resources/{self.crypto}-background.png"
-        
-        image = Image.open(background_path)
-        draw = ImageDraw.Draw(image)
-        font_path = current / f"../resources/retro-pixel-petty-5h.ttf"
-        font = ImageFont.truetype(font_path, size=5)
-        color = "rgb(255, 255, 255)"  # symbol in white color
-        if self.price_change_24h >= 0:
-            price_color = "rgb(0, 255, 0)"
-        else:
-            price_color = "rgb(255, 0, 0)"
+    @property
+    def key(self) -> str:
+        return f"crypto:{self.crypto}"
 
-        init_x = self.get_text_initial_position(self.symbol)
-        (x, y) = (init_x, 16)
-        draw.text((x, y), self.symbol, fill=color, font=font)
+    @property
+    def background(self) -> str:
+        return f"{self.crypto}-background.png"
 
-        init_x = self.get_text_initial_position(text)
-
-        (x, y) = (init_x, 23)
-        draw.text((x, y), text, fill=price_color, font=font)
-
-        image.save(image_path)
-
-    async def run(self):
-        await self.get_data()
+    async def get_data(self):
+        # Every Crypto tile reads from the same batched CoinGecko snapshot
+        market = self.provider.get(self.crypto)
+        logger.debug(f"Price obtained from CoinGecko API: {market.price}")
+
+        self.symbol = market.symbol
+        self.price = market.price
+        self.price_change_24h = market.price_change_24h
+
+    def layout(self, text: str) -> Layout:
+        return Layout(
+            self.background,
+            [
+                TextLine(self.symbol, y=16),
+                TextLine(text, y=23, color=trend_color(self.price_change_24h)),
+            ],
+        )
+
+    async def prepare(self) -> RenderedTile:
+        await self.ensure_data()
         price = self.format_number(self.price)
         price_str = f"${price}"
 
-        with tempfile.NamedTemporaryFile(mode="wb", suffix=".png", delete=False) as tmp_image:
-            self.create_image(price_str, Path(tmp_image.name))
-            logger.debug(f"New Image generated: {tmp_image.name}")
-
-            await self.send(Path(tmp_image.name), False)
-            tmp_image.close()
-            os.unlink(tmp_image.name)
+        return RenderedTile([self.render(price_str)])
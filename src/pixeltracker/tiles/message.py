@@ -6,6 +6,7 @@ from pathlib import Path
 from typing import Optional
 
 from PIL import Image, ImageDraw, ImageFont
+from ..messages import PRIORITY_MESSAGE
 from ..screen import IDotMatrixScreen
 from ..settings import settings
 
@@ -17,19 +18,23 @@ import asyncio
 
 class Message(IDotMatrixTile):
     message: str
+    priority: int
+    # Width in pixels of the scrolling text, known once it is sent
+    rendered_width: Optional[int] = None
 
-    def __init__(self, idms: IDotMatrixScreen, message: str, test: bool):
+    def __init__(self, idms: IDotMatrixScreen, message: str, test: bool, priority: int = PRIORITY_MESSAGE):
         super().__init__(idms, test)
         self.message = message
+        self.priority = priority
 
     async def run(self):
         current = Path(__file__).parent.resolve()
         font_path = current / f"../resources/org_01.ttf"
-        await self.send_text(self.message, font_path)
+        self.rendered_width = await self.send_text(self.message, font_path)
     
     async def get_data(self):
         pass
     
-    def create_image(self, text: str, image_path: Path):
+    def create_image(self, text: str) -> Optional[Image.Image]:
         pass
         
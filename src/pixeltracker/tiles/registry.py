@@ -0,0 +1,91 @@
+import importlib
+import logging
+from importlib.metadata import entry_points
+from typing import TYPE_CHECKING, Dict, Iterable, List, Type, Union
+
+if TYPE_CHECKING:
+    from ..screen import IDotMatrixScreen
+    from .tile import IDotMatrixTile
+
+logger = logging.getLogger("pixelart-tracker")
+
+# Third party packages add tiles with an entry point in this group, e.g. in pyproject.toml:
+# [project.entry-points."pixeltracker.tiles"]
+# weather = "mypackage.weather:Weather"
+ENTRY_POINT_GROUP = "pixeltracker.tiles"
+
+# Tile names used in settings.TILES, as "module:class" so they are only imported when configured
+BUILTIN_TILES = {
+    "yt": "pixeltracker.tiles.yt_viewers:YoutubeViewers",
+    "crypto": "pixeltracker.tiles.crypto:Crypto",
+    "finance": "pixeltracker.tiles.finance:Finance",
+}
+
+
+def import_object(spec: str):
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+class TileRegistry:
+    """Maps tile names to tile classes, a tile module is only imported the first time its name is used."""
+
+    def __init__(self):
+        self.specs: Dict[str, Union[str, "Type[IDotMatrixTile]"]] = dict(BUILTIN_TILES)
+        self.classes: Dict[str, "Type[IDotMatrixTile]"] = {}
+        self.discovered = False
+
+    def register(self, name: str, spec: Union[str, "Type[IDotMatrixTile]"]):
+        """adds a tile, as a class or as a "module:class" string imported when first used"""
+        self.specs[name] = spec
+        self.classes.pop(name, None)
+
+    def discover(self):
+        """adds the tiles of the installed packages, without importing them"""
+        if self.discovered:
+            return
+        self.discovered = True
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name in self.specs:
+                logger.warning(f"Ignoring tile {entry_point.name} of {entry_point.value}, the name is already taken")
+                continue
+            self.specs[entry_point.name] = entry_point.value
+            logger.debug(f"Discovered tile {entry_point.name}: {entry_point.value}")
+
+    def names(self) -> List[str]:
+        self.discover()
+        return list(self.specs)
+
+    def load(self, name: str) -> "Type[IDotMatrixTile]":
+        tile_class = self.classes.get(name)
+        if tile_class is not None:
+            return tile_class
+
+        spec = self.specs.get(name)
+        if spec is None:
+            self.discover()
+            spec = self.specs.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown tile {name}, available tiles: {', '.join(self.names())}")
+
+        tile_class = import_object(spec) if isinstance(spec, str) else spec
+        self.classes[name] = tile_class
+        logger.debug(f"Loaded tile {name}")
+        return tile_class
+
+    def build(self, idms: "IDotMatrixScreen", names: Iterable[str], test: bool) -> List["IDotMatrixTile"]:
+        tiles = []
+        for entry in names:
+            name = entry.strip()
+            if not name:
+                continue
+            try:
+                tile_class = self.load(name)
+            except KeyError as e:
+                logger.error(str(e.args[0]))
+                continue
+            tiles.extend(tile_class.from_settings(idms, test))
+        return tiles
+
+
+tile_registry = TileRegistry()
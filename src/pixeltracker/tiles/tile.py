@@ -1,34 +1,98 @@
 import logging
-import math
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
 from decimal import Decimal
 from pathlib import Path
-from typing import Union
+from typing import List, Optional, Sequence, Union
 
-import aiohttp
+from PIL import Image
 
 # idotmatrix imports
+from ..compositor import Layout, compositor
+from ..http_client import http_client
+from ..layout import text_layout
+from ..metrics import STAGE_SECONDS
+from ..refresher import DataSource
+from ..resource_cache import resource_cache
 from ..screen import IDotMatrixScreen
 
 logger = logging.getLogger("pixelart-tracker")
 
+STALE_MARKER_COLOR = (255, 160, 0)
 
-class IDotMatrixTile(ABC):
+
+@dataclass
+class RenderedTile:
+    """Frames of a tile ready to upload, a single frame unless durations make it an animation."""
+
+    frames: List[Image.Image]
+    # Milliseconds every frame is shown
+    durations: Optional[List[int]] = None
+
+
+class IDotMatrixTile(DataSource, ABC):
     test: bool = False
     idms: IDotMatrixScreen
+    background: Optional[str] = None
+    # Shared source the tile reads its data from, if the tile doesn't fetch it by itself
+    provider: Optional[DataSource] = None
 
     def __init__(self, idms: IDotMatrixScreen, test=False):
         self.idms = idms
         self.test = test
 
+    @classmethod
+    def from_settings(cls, idms: IDotMatrixScreen, test: bool) -> List["IDotMatrixTile"]:
+        """tiles of this kind to show, as configured in the settings"""
+        return [cls(idms, test)]
+
+    def detach(self):
+        """releases what the tile registered in its provider, once no tile shows its content anymore"""
+
     @abstractmethod
     async def get_data(self):
         pass
 
-    async def get_json(self, url: str) -> str:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                return await response.json()
+    @property
+    def key(self) -> str:
+        """identifies the content shown by this tile, e.g. crypto:bitcoin"""
+        return self.__class__.__name__.lower()
+
+    def data_sources(self) -> List[DataSource]:
+        """sources the refresh scheduler has to keep warm for this tile"""
+        if self.provider is not None:
+            return [self.provider]
+        return [self]
+
+    @property
+    def stale(self) -> bool:
+        if self.provider is not None:
+            return self.provider.stale
+        return super().stale
+
+    def mark_stale(self, frame: Image.Image):
+        """flags outdated data with a small dot in the top right corner"""
+        frame.paste(STALE_MARKER_COLOR, (frame.width - 2, 0, frame.width, 2))
+
+    async def ensure_data(self):
+        if self.provider is None:
+            await super().ensure_data()
+            return
+        await self.provider.ensure_data()
+        # Copy the values of the shared snapshot into the tile
+        await self.get_data()
+
+    async def get_json(self, url: str) -> dict:
+        return await http_client.get_json(url)
+
+    def load_resources(self):
+        """loads the fonts, glyphs and background used by create_image into the caches"""
+        if self.background:
+            resource_cache.background(self.background)
+            resource_cache.font()
+            text_layout.metrics()
+            compositor.background(self.background)
+            compositor.preload()
 
     def format_number(self, number: Union[int, Decimal]) -> str:
         if not isinstance(number, Decimal):
@@ -66,31 +130,56 @@ class IDotMatrixTile(ABC):
         return text.replace(".", ",")
 
     def get_text_initial_position(self, text: str) -> int:
-        chars = len(text)
-        total_screen_size = 32  # 32pxx32px screen
-        offset = 0
-        if text.count(",") >= 1:
-            offset = -2
-        if text.count("M") >= 1:
-            offset = offset + 1
-        if len(text) == 4: # Quai
-            offset = -3
-        total_pixels = (chars * 4) + (chars - 1) + offset  # 4px per character + 1px between characters + offset
-
-        return max(math.floor((total_screen_size - total_pixels) / 2), 0)
+        return text_layout.center_x(text)
 
     async def send(self, image_path: Path, process_image: bool):
         await self.idms.set_image(image_path, process_image)
         logger.debug(f"Sent image to screen: {image_path}")
 
-    async def send_text(self, text: str, font_path: Path): 
-        await self.idms.set_text(text, font_path)
+    async def send_frame(self, frame: Image.Image):
+        if self.stale:
+            self.mark_stale(frame)
+        await self.idms.set_frame(frame, slot=self.key)
+        logger.debug(f"Sent frame to screen: {self.__class__.__name__}")
+
+    async def send_animation(self, frames: Sequence[Image.Image], durations: Sequence[int]):
+        if self.stale:
+            for frame in frames:
+                self.mark_stale(frame)
+        await self.idms.set_animation(frames, durations, slot=self.key)
+        logger.debug(f"Sent {len(frames)} frames animation to screen: {self.__class__.__name__}")
+
+    async def send_text(self, text: str, font_path: Path) -> int:
+        width = await self.idms.set_text(text, font_path)
         logger.debug(f"Sent text to screen: {text}")
+        return width
+
+    def layout(self, text: str) -> Optional[Layout]:
+        """describes the frame showing text, tiles without a frame return None"""
+        return None
+
+    def create_image(self, text: str) -> Optional[Image.Image]:
+        layout = self.layout(text)
+        if layout is None:
+            return None
+        return compositor.render(layout)
+
+    def render(self, text: str) -> Optional[Image.Image]:
+        with STAGE_SECONDS.time(stage="render", source=self.key):
+            return self.create_image(text)
+
+    async def prepare(self) -> Optional[RenderedTile]:
+        """fetches the data and renders the frames to show, without touching the device"""
+        await self.ensure_data()
+        return None
+
+    async def show(self, rendered: RenderedTile):
+        if rendered.durations is None:
+            await self.send_frame(rendered.frames[0])
+        else:
+            await self.send_animation(rendered.frames, rendered.durations)
 
-    @abstractmethod
-    def create_image(self, text: str, image_path: Path):
-        pass
-
-    @abstractmethod
     async def run(self):
-        await self.get_data()
+        rendered = await self.prepare()
+        if rendered is not None:
+            await self.show(rendered)
@@ -1,69 +1,43 @@
 import logging
-import os
-import tempfile
-from pathlib import Path
-from random import randrange
 
-from PIL import Image, ImageDraw, ImageFont
-from ..settings import settings
+from ..compositor import ALIGN_LEFT, Layout, TextLine
+from ..providers import youtube_provider
+from ..screen import IDotMatrixScreen
 
-from .tile import IDotMatrixTile
+from .tile import IDotMatrixTile, RenderedTile
 
 logger = logging.getLogger("pixelart-tracker")
 
 
 class YoutubeViewers(IDotMatrixTile):
     subscribers: int = 0
-    test_subscribers: int = 0
+    background = "yt-background.png"
 
-    async def get_data(self):
-        if self.test:
-            self.test_subscribers = self.test_subscribers + randrange(1000)
-            self.subscribers = self.test_subscribers
-            return
-
-        yt_api_url = settings.YOUTUBE_API_HOST
-        channel_id = settings.YOUTUBE_CHANNEL_ID
-        api_key = settings.YOUTUBE_API_KEY
-        url = f"{yt_api_url}&id={channel_id}&key={api_key}"
-        response = await self.get_json(url)
-
-        items = response["items"]
-        if len(items) < 1:
-            raise ValueError("Not enough items")
-
-        subscribers = items[0]["statistics"]["subscriberCount"]
-
-        logger.debug(f"Subscribers obtained from YouTube Data API: {subscribers}")
-
-        self.subscribers = int(subscribers)
+    def __init__(self, idms: IDotMatrixScreen, test: bool = False):
+        super().__init__(idms, test)
+        self.provider = youtube_provider
+        if test:
+            self.provider.test = True
 
-    def create_image(self, text: str, image_path: Path):
-        current = Path(__file__).resolve()
-        background_path = current / f"../../resources/yt-background.png"
-        image = Image.open(background_path)
-        draw = ImageDraw.Draw(image)
-        font_path = current / f"../../resources/retro-pixel-petty-5h.ttf"
-        font = ImageFont.truetype(font_path, size=5)
-        color = "rgb(255, 255, 255)"  # white color
+    @property
+    def key(self) -> str:
+        return "yt"
 
-        init_x = self.get_text_initial_position(text)
-
-        (x, y) = (init_x, 15)
-        draw.text((x, y), text, fill=color, font=font)
-        (x, y) = (6, 23)
-        draw.text((x, y), "Subs", fill=color, font=font)
-
-        image.save(image_path)
-
-    async def run(self):
-        await super().run()
+    async def get_data(self):
+        # Every YouTube tile reads from the same shared snapshot
+        self.subscribers = self.provider.subscribers
+
+    def layout(self, text: str) -> Layout:
+        return Layout(
+            self.background,
+            [
+                TextLine(text, y=15),
+                TextLine("Subs", y=23, align=ALIGN_LEFT, x=6),
+            ],
+        )
+
+    async def prepare(self) -> RenderedTile:
+        await self.ensure_data()
         subs_str = self.format_number(self.subscribers)
 
-        with tempfile.NamedTemporaryFile(mode="wb", suffix=".png", delete=False) as tmp_image:
-            self.create_image(subs_str, Path(tmp_image.name))
-            logger.debug(f"New Image generated: {tmp_image.name}")
-
-            await self.send(Path(tmp_image.name), False)
-            tmp_image.close()
-            os.unlink(tmp_image.name)
+        return RenderedTile([self.render(subs_str)])
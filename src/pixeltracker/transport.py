@@ -0,0 +1,52 @@
+import asyncio
+import logging
+
+from bleak.exc import BleakError
+
+from .settings import settings
+
+logger = logging.getLogger("pixelart-tracker")
+
+# GATT characteristic the iDotMatrix devices receive commands on, as in idotmatrix.const
+UUID_WRITE_DATA = "0000fa02-0000-1000-8000-00805f9b34fb"
+
+# Used when the BLE backend doesn't report the negotiated MTU
+DEFAULT_ATT_MTU = 23
+ATT_HEADER_SIZE = 3
+
+
+class ChunkedWriter:
+    """Writes a payload in chunks sized to the BLE MTU, the device acknowledges every chunk before the next one."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.chunks = 0
+
+    def chunk_size(self) -> int:
+        mtu = getattr(self.conn.client, "mtu_size", None) or DEFAULT_ATT_MTU
+        return max(mtu - ATT_HEADER_SIZE, DEFAULT_ATT_MTU - ATT_HEADER_SIZE)
+
+    async def write(self, data: bytes) -> int:
+        """sends the whole payload, raises the BLE errors so the connection supervisor replays it"""
+        client = self.conn.client
+        if client is None or not getattr(client, "write_gatt_char", None):
+            # Not a bleak client, e.g. a fake device: let idotmatrix send it
+            await self.conn.send(data=data)
+            return len(data)
+
+        await self.conn.connect()
+        if not client.is_connected:
+            raise BleakError("Device disconnected")
+
+        size = self.chunk_size()
+        for start in range(0, len(data), size):
+            # A write with response only returns once the device acknowledged the chunk
+            await asyncio.wait_for(
+                client.write_gatt_char(UUID_WRITE_DATA, data[start : start + size], response=True),
+                timeout=settings.BLE_WRITE_TIMEOUT,
+            )
+            self.chunks += 1
+            if settings.BLE_CHUNK_DELAY:
+                await asyncio.sleep(settings.BLE_CHUNK_DELAY)
+        logger.debug(f"Sent {len(data)} bytes in chunks of {size} bytes")
+        return len(data)
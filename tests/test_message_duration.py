@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("pydantic")
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+pytest.importorskip("idotmatrix")
+
+from pixeltracker.display import message_duration  # noqa: E402
+from pixeltracker.screen import TEXT_CHAR_SEPARATOR, text_width  # noqa: E402
+from pixeltracker.settings import settings  # noqa: E402
+
+
+def char_bitmap(*columns: int) -> bytes:
+    """a 16x32 character of idotmatrix with the given columns lit in every row"""
+    row = sum(1 << column for column in columns).to_bytes(2, "little")
+    return TEXT_CHAR_SEPARATOR + row * 32
+
+
+def test_text_width_ends_at_last_lit_column():
+    bitmaps = char_bitmap(3, 12) + char_bitmap(1, 5) + char_bitmap()
+    assert text_width(bitmaps) == 16 + 6
+
+
+def test_text_width_of_blank_text():
+    assert text_width(char_bitmap() * 3) == 0
+
+
+def test_message_duration_follows_text_speed(monkeypatch):
+    width = 640
+    monkeypatch.setattr(settings, "TEXT_SPEED", 100)
+    fast = message_duration("", width)
+    monkeypatch.setattr(settings, "TEXT_SPEED", 50)
+    slow = message_duration("", width)
+    assert slow == pytest.approx(2 * fast)
+
+
+def test_message_duration_is_clamped_for_short_texts(monkeypatch):
+    monkeypatch.setattr(settings, "TEXT_SPEED", 100)
+    assert message_duration("HI") == 7
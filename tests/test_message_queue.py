@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("pydantic")
+
+from pixeltracker.messages import (  # noqa: E402
+    OVERFLOW_DROP_OLDEST,
+    OVERFLOW_MERGE,
+    PRIORITY_PAYMENT,
+    MessageQueue,
+    QueuedMessage,
+)
+
+
+def payment(text: str, enqueued_at: float) -> QueuedMessage:
+    # Far enough apart not to be coalesced
+    return QueuedMessage(text, priority=PRIORITY_PAYMENT, payment=True, amount_sats=21, enqueued_at=enqueued_at)
+
+
+@pytest.mark.parametrize("overflow", [OVERFLOW_DROP_OLDEST, OVERFLOW_MERGE])
+def test_full_queue_of_payments_drops_incoming_message(overflow):
+    queue = MessageQueue(maxsize=2, overflow=overflow, coalesce_window=0)
+    queue.put_nowait(payment("FIRST", 1.0))
+    queue.put_nowait(payment("SECOND", 2.0))
+
+    queue.put_nowait(QueuedMessage("GM"))
+
+    assert [item.text for item in queue.items] == ["FIRST", "SECOND"]
+    assert queue.dropped == 1
+
+
+def test_full_queue_drops_oldest_message_for_payment():
+    queue = MessageQueue(maxsize=2, overflow=OVERFLOW_DROP_OLDEST, coalesce_window=0)
+    queue.put_nowait(QueuedMessage("GM"))
+    queue.put_nowait(payment("FIRST", 1.0))
+
+    queue.put_nowait(payment("SECOND", 2.0))
+
+    assert [item.text for item in queue.items] == ["FIRST", "SECOND"]
+    assert queue.dropped == 1